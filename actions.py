@@ -4,13 +4,14 @@ import random
 from typing import Optional, Tuple, TYPE_CHECKING
 
 import categories.color as color
+import config
 import exceptions
-from entity import Chest
-from categories.skills import WEAPON_SKILL_MAP, EquipmentType
+from entity import Chest, Item
+from categories.skills import SKILL_BY_WEAPON
 
 if TYPE_CHECKING:
     from engine import Engine
-    from entity import Actor, Entity, Item, Chest
+    from entity import Actor, Entity
 
 class Action:
     def __init__(self, entity: Actor) -> None:
@@ -44,22 +45,21 @@ class PickupAction(Action):
         actor_location_y = self.entity.y
         inventory = self.entity.inventory
 
-        for item in self.engine.game_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
+        for item in self.engine.game_map.get_entities_at_location(actor_location_x, actor_location_y):
+            if isinstance(item, Item):
                 # Check if the item can fit in terms of capacity
                 if len(inventory.items) >= inventory.capacity:
                     raise exceptions.Impossible("You can't shove the item in your inventory.")
 
                 # Check if the item can fit in terms of weight
-                total_weight = sum(i.weight for i in inventory.items)
-                if total_weight + item.weight > inventory.max_weight:
+                if not inventory.can_carry(item):
                     raise exceptions.Impossible("You're too weak to carry more.")
 
                 # Add the item to the inventory
-                self.engine.game_map.entities.remove(item)
+                self.engine.game_map.remove_entity(item)
                 item.parent = self.entity.inventory
 
-                inventory.items.append(item)
+                inventory.add(item)
 
                 self.engine.message_log.add_message(f"You get {item.name}")
                 return
@@ -148,6 +148,9 @@ class MeleeAction(ActionWithDirection):
         if not target:
             raise exceptions.Impossible("You can't attack the air.")
 
+        # Hit or miss, a fight is heard around it.
+        self.engine.game_map.make_noise(self.entity.x, self.entity.y, config.NOISE_RADIUS)
+
         chance_to_hit = 70 + 2 * (self.entity.fighter.dexterity - target.fighter.dexterity)
         
         dice = random.randint(1, 100)
@@ -168,14 +171,15 @@ class MeleeAction(ActionWithDirection):
         
 
         if damage > 0:
-            if self.entity is self.engine.player:
-                self.engine.player.skill_list.skills["Martial Arts"].add_xp(15)
-            if target is self.engine.player:
-                self.engine.player.skill_list.skills["Pain Mastering"].add_xp(15)
-            for skill_name, weapon_class in WEAPON_SKILL_MAP.items():
-                item_seguro: Item = self.engine.player.equipment.slots[EquipmentType.HANDS]
-                if item_seguro and item_seguro.equippable.equipment_type is weapon_class:
-                    self.engine.player.skill_list.skills[skill_name].add_xp(15)
+            player = self.engine.player
+            # XP is applied at the end of the turn, see SkillList.apply_xp.
+            if self.entity is player:
+                player.skill_list.gain_xp("Martial Arts", 15)
+                weapon_skill = SKILL_BY_WEAPON.get(player.equipment.weapon_class)
+                if weapon_skill:
+                    player.skill_list.gain_xp(weapon_skill, 15)
+            if target is player:
+                player.skill_list.gain_xp("Pain Mastering", 15)
             extra_damage_message = ""
             if dice == 1:
                 damage = damage*2
@@ -217,6 +221,7 @@ class MovementAction(ActionWithDirection):
                         item.spawn(self.engine.game_map, dest_x, dest_y)
                         item.parent = self.engine.game_map
                     self.engine.message_log.add_message("You broke the container!")
+                    self.engine.game_map.make_noise(dest_x, dest_y, config.NOISE_RADIUS)
                     return  # Finaliza a ação após interagir com o baú
                 else:
                     for item in blocking_entity.open(self.engine.player):
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+if TYPE_CHECKING:
+    from entity import Actor
+    from map_chunks import VisibleWindow
+
+
+class ActorStore:
+    """
+    The actors of a GameMap as columns of NumPy arrays (position, HP, stats, alive, awake), one row per actor.
+
+    Rows are kept in sync with the Actor objects: GameMap calls `add`, `remove` and `move`,
+    and `Actor.sync` calls `update` when HP, equipment or the AI change.
+    Once per enemy turn `begin_turn` computes the values every AI needs (distance to the
+    player, visibility) for all actors at once, instead of each AI working them out alone.
+
+    Actors far from the player are asleep and get no turns: `begin_turn` wakes the ones within
+    `wake_radius` of the player and puts to sleep the ones beyond `sleep_radius`, and `wake_near`
+    wakes the ones that hear a noise. Actors that woke up are collected in `woken` for the
+    TurnScheduler, so the AI work of a turn grows with the actors around the player,
+    not with everything on the map.
+    """
+
+    def __init__(self, actors: Iterable[Actor] = (), capacity: int = 64):
+        self.actors: List[Actor] = []
+        self.rows: Dict[Actor, int] = {}
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.hp = np.zeros(capacity, dtype=np.int32)
+        self.power = np.zeros(capacity, dtype=np.int32)
+        self.defense = np.zeros(capacity, dtype=np.int32)
+        self.dexterity = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.awake = np.zeros(capacity, dtype=bool)
+        # Filled by begin_turn, valid until the next one.
+        self.distance = np.zeros(0, dtype=np.int32)
+        self.in_fov = np.zeros(0, dtype=bool)
+        # Actors that woke up since the last take_woken.
+        self.woken: List[Actor] = []
+        for actor in actors:
+            self.add(actor)
+
+    @property
+    def mirrored(self) -> List[np.ndarray]:
+        """The columns copied from the Actor objects."""
+        return [self.x, self.y, self.hp, self.power, self.defense, self.dexterity, self.alive]
+
+    @property
+    def columns(self) -> List[np.ndarray]:
+        return self.mirrored + [self.awake]
+
+    def __len__(self) -> int:
+        return len(self.actors)
+
+    def __contains__(self, actor: Actor) -> bool:
+        return actor in self.rows
+
+    def _grow(self) -> None:
+        self.x, self.y, self.hp, self.power, self.defense, self.dexterity, self.alive, self.awake = (
+            np.concatenate([column, np.zeros_like(column)]) for column in self.columns
+        )
+
+    def add(self, actor: Actor) -> None:
+        if actor in self.rows:
+            self.update(actor)
+            return
+        if len(self.actors) == len(self.x):
+            self._grow()
+        self.rows[actor] = len(self.actors)
+        self.awake[len(self.actors)] = False  # Until the next begin_turn finds it near the player.
+        self.actors.append(actor)
+        self.update(actor)
+
+    def remove(self, actor: Actor) -> None:
+        """Remove an actor, moving the last row into its place."""
+        row = self.rows.pop(actor)
+        last = len(self.actors) - 1
+        moved = self.actors.pop()
+        if row != last:
+            self.actors[row] = moved
+            self.rows[moved] = row
+            for column in self.columns:
+                column[row] = column[last]
+            if last < len(self.distance):
+                self.distance[row] = self.distance[last]
+                self.in_fov[row] = self.in_fov[last]
+            elif row < len(self.distance):
+                # The moved actor joined after the last begin_turn, it is measured again by turn_values.
+                self.distance[row] = -1
+        # Turn values past the last row belong to no one now.
+        self.distance = self.distance[:last]
+        self.in_fov = self.in_fov[:last]
+
+    def discard(self, actor: Actor) -> None:
+        if actor in self.rows:
+            self.remove(actor)
+
+    def clear(self) -> None:
+        self.actors.clear()
+        self.rows.clear()
+        self.woken.clear()
+        self.distance = self.distance[:0]
+        self.in_fov = self.in_fov[:0]
+
+    def move(self, actor: Actor) -> None:
+        """Copy the actor's position into its row."""
+        row = self.rows[actor]
+        self.x[row] = actor.x
+        self.y[row] = actor.y
+        if row < len(self.distance):
+            self.distance[row] = -1  # Measured before the move, see turn_values.
+
+    def update(self, actor: Actor) -> None:
+        """Copy every column from the actor."""
+        row = self.rows[actor]
+        fighter = actor.fighter
+        self.x[row] = actor.x
+        self.y[row] = actor.y
+        self.hp[row] = fighter.hp
+        self.power[row] = fighter.power
+        self.defense[row] = fighter.defense
+        self.dexterity[row] = fighter.dexterity
+        self.alive[row] = actor.is_alive
+
+    def begin_turn(self, player: Actor, visible: VisibleWindow, wake_radius: int, sleep_radius: int) -> None:
+        """
+        Compute the turn values for every row, then wake the actors within `wake_radius`
+        of the player and put to sleep the ones beyond `sleep_radius`.
+        """
+        self.measure(player, visible)
+        count = len(self.actors)
+        # Between the two radii actors keep their state, so they don't flicker at the edge.
+        awake = self.awake[:count]
+        asleep = ~awake
+        awake |= self.distance <= wake_radius
+        awake &= self.distance <= max(sleep_radius, wake_radius)
+        self._note_woken(np.flatnonzero(awake & asleep))
+
+    def measure(self, player: Actor, visible: VisibleWindow) -> None:
+        """Compute `distance` (Chebyshev, to the player) and `in_fov` for every row."""
+        count = len(self.actors)
+        x, y = self.x[:count], self.y[:count]
+        self.distance = np.maximum(np.abs(x - player.x), np.abs(y - player.y))
+
+        # Only the FOV window can be visible, so it is looked up for the actors inside it.
+        left, top, right, bottom = visible.window
+        self.in_fov = np.zeros(count, dtype=bool)
+        inside = (x >= left) & (x < right) & (y >= top) & (y < bottom)
+        self.in_fov[inside] = visible.cells[x[inside] - left, y[inside] - top]
+
+    def turn_values(self, actor: Actor, player: Actor, visible: VisibleWindow) -> Tuple[int, bool]:
+        """
+        Return the actor's (distance, in_fov) from the last `begin_turn`,
+        computing them again if the actor joined or moved after it.
+        """
+        row = self.rows[actor]
+        if row >= len(self.distance):
+            self.measure(player, visible)
+        elif self.distance[row] < 0:
+            self.distance[row] = max(abs(actor.x - player.x), abs(actor.y - player.y))
+            self.in_fov[row] = visible[actor.x, actor.y]
+        return int(self.distance[row]), bool(self.in_fov[row])
+
+    def wake_near(self, x: int, y: int, radius: int) -> None:
+        """Wake every actor within `radius` (Chebyshev) of (x, y)."""
+        count = len(self.actors)
+        near = np.maximum(np.abs(self.x[:count] - x), np.abs(self.y[:count] - y)) <= radius
+        self._note_woken(np.flatnonzero(near & ~self.awake[:count]))
+        self.awake[:count] |= near
+
+    def _note_woken(self, rows: np.ndarray) -> None:
+        self.woken.extend(self.actors[row] for row in rows)
+
+    def take_woken(self) -> List[Actor]:
+        """Return and forget the actors that woke up since the last call."""
+        woken, self.woken = self.woken, []
+        return woken
+
+    def is_active(self, actor: Actor) -> bool:
+        """True if the actor is in the store, alive and awake."""
+        row = self.rows.get(actor)
+        return row is not None and bool(self.alive[row] and self.awake[row])
+
+    def active(self, exclude: Actor) -> List[Actor]:
+        """The living, awake actors other than `exclude`, in row order."""
+        count = len(self.actors)
+        rows = np.flatnonzero(self.alive[:count] & self.awake[:count])
+        return [self.actors[row] for row in rows if self.actors[row] is not exclude]
+
+    def check(self, actors: Iterable[Actor]) -> None:
+        """Raise AssertionError if the rows don't match `actors` and their current state."""
+        actors = set(actors)
+        assert set(self.rows) == actors, f"Store has {len(self.rows)} actors, map has {len(actors)}."
+        for actor, row in self.rows.items():
+            assert self.actors[row] is actor, f"{actor.name} is filed in the wrong row."
+            expected = (
+                actor.x, actor.y, actor.fighter.hp, actor.fighter.power, actor.fighter.defense,
+                actor.fighter.dexterity, actor.is_alive,
+            )
+            stored = tuple(column[row].item() for column in self.mirrored)
+            assert stored == expected, f"{actor.name} is stored as {stored} but is {expected}."
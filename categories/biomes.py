@@ -1,3 +1,7 @@
+import hashlib
+
+import numpy as np
+
 import categories.tile_types as tile_types
 
 class Biome:
@@ -13,6 +17,12 @@ class Biome:
                 self.humidity_range[0] <= humidity <= self.humidity_range[1] and
                 self.temperature_range[0] <= temperature <= self.temperature_range[1])
 
+    def mask(self, elevation: np.ndarray, humidity: np.ndarray, temperature: np.ndarray) -> np.ndarray:
+        """Array version of `matches`, the arguments are broadcast against each other."""
+        return ((self.elevation_range[0] <= elevation) & (elevation <= self.elevation_range[1]) &
+                (self.humidity_range[0] <= humidity) & (humidity <= self.humidity_range[1]) &
+                (self.temperature_range[0] <= temperature) & (temperature <= self.temperature_range[1]))
+
 # Define biomes with their ranges and associated tile type
 biomes = [
     Biome("Water", (0, 0.3), (0, 1), (-10, 0), tile_types.floor_water),
@@ -25,4 +35,107 @@ biomes = [
     Biome("Shrubland", (0.4, 0.7), (0.3, 0.4), (0.3, 0.6), tile_types.floor_shrubland),
     Biome("Marsh", (0.2, 0.4), (0.5, 0.7), (0.3, 0.5), tile_types.floor_marsh),
     Biome("Savanna", (0.5, 0.7), (0.3, 0.5), (0.4, 0.7), tile_types.floor_savanna)
-]
\ No newline at end of file
+]
+
+
+class BiomeTable:
+    """
+    Biome ranges compiled into a quantized 3D lookup table over (elevation, humidity, temperature).
+
+    Each axis covers [0, 1] (the range of the noise layers) in `resolution` steps, and every cell
+    holds the index of the first biome matching the centre of that cell. Cells no biome covers
+    point to `tile_types.floor_error`.
+    """
+
+    def __init__(self, biome_list: list, resolution: int = 100):
+        self.biomes = list(biome_list)
+        self.resolution = resolution
+        # Index len(biomes) is the fallback for uncovered cells.
+        self.tiles = np.array([biome.tile_type for biome in self.biomes] + [tile_types.floor_error], dtype=np.uint8)
+        self.error_index = len(self.biomes)
+
+        self.lookup = np.full((resolution,) * 3, fill_value=self.error_index, dtype=np.uint8)
+        masks = self.masks()
+        # Go backwards so the first biome in the list wins, like the old per tile search.
+        for index in reversed(range(len(self.biomes))):
+            self.lookup[masks[index]] = index
+
+    def masks(self) -> list[np.ndarray]:
+        """Return, for each biome, the cells of the table whose centre it matches."""
+        centers = (np.arange(self.resolution) + 0.5) / self.resolution
+        shape = (self.resolution,) * 3
+        return [
+            np.broadcast_to(biome.mask(centers[:, None, None], centers[None, :, None], centers[None, None, :]), shape)
+            for biome in self.biomes
+        ]
+
+    def classify(self, elevation: np.ndarray, humidity: np.ndarray, temperature: np.ndarray) -> np.ndarray:
+        """Return the tile ids for whole blocks of noise values with a single table lookup."""
+        last = self.resolution - 1
+        e = np.clip((elevation * self.resolution).astype(np.intp), 0, last)
+        h = np.clip((humidity * self.resolution).astype(np.intp), 0, last)
+        t = np.clip((temperature * self.resolution).astype(np.intp), 0, last)
+        return self.tiles[self.lookup[e, h, t]]
+
+    def digest(self) -> str:
+        """
+        Short hash of everything `classify` depends on: the table, the tile ids and the tiles they
+        point to. Cached worlds are keyed by it, so editing a biome or a tile invalidates them.
+        """
+        digest = hashlib.sha1()
+        for array in (self.lookup, self.tiles, tile_types.palette):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()[:12]
+
+    def overlaps(self) -> list[tuple[Biome, Biome, int]]:
+        """Return (winner, shadowed, cell count) for every pair of biomes that cover the same cells."""
+        found = []
+        masks = self.masks()
+        for i, first in enumerate(self.biomes):
+            for j in range(i + 1, len(self.biomes)):
+                count = int(np.count_nonzero(masks[i] & masks[j]))
+                if count:
+                    found.append((first, self.biomes[j], count))
+        return found
+
+    def uncovered_boxes(self) -> list[tuple[tuple[float, float], ...]]:
+        """Split the cells no biome covers into boxes of ((min, max) elevation, humidity, temperature)."""
+        remaining = self.lookup == self.error_index
+        boxes = []
+        step = 1 / self.resolution
+        while remaining.any():
+            e0, h0, t0 = (int(i) for i in np.argwhere(remaining)[0])
+            # Grow the box one axis at a time for as long as every cell in it is uncovered.
+            e1 = e0 + 1
+            while e1 < self.resolution and remaining[e1, h0, t0]:
+                e1 += 1
+            h1 = h0 + 1
+            while h1 < self.resolution and remaining[e0:e1, h1, t0].all():
+                h1 += 1
+            t1 = t0 + 1
+            while t1 < self.resolution and remaining[e0:e1, h0:h1, t1].all():
+                t1 += 1
+            remaining[e0:e1, h0:h1, t0:t1] = False
+            boxes.append(((e0 * step, e1 * step), (h0 * step, h1 * step), (t0 * step, t1 * step)))
+        return boxes
+
+    def report(self, max_boxes: int = 10) -> None:
+        """Print the overlapping and uncovered parts of the biome table."""
+        for winner, shadowed, count in self.overlaps():
+            print (f" - Biome {winner.name} overlaps {shadowed.name} in {count} cells, {winner.name} wins there.")
+        uncovered = int(np.count_nonzero(self.lookup == self.error_index))
+        if not uncovered:
+            return
+        print (f" - {uncovered / self.lookup.size:.1%} of the biome space has no biome and will use floor_error:")
+        boxes = self.uncovered_boxes()
+        for (e0, e1), (h0, h1), (t0, t1) in boxes[:max_boxes]:
+            print (f"   height:{e0:0.2f}-{e1:0.2f} humid:{h0:0.2f}-{h1:0.2f} temp:{t0:0.2f}-{t1:0.2f}")
+        if len(boxes) > max_boxes:
+            print (f"   ...and {len(boxes) - max_boxes} more regions.")
+
+
+def compile_biomes(biome_list: list = biomes, resolution: int = 100) -> BiomeTable:
+    """Compile the biome ranges into a lookup table and report gaps and overlaps."""
+    table = BiomeTable(biome_list, resolution)
+    table.report()
+    return table
@@ -34,3 +34,6 @@ WEAPON_SKILL_MAP = {
     "Sending": Launcher,          # Lançadores
     "Throwing": Throwable         # Armas arremessáveis
 }
+
+# O mesmo mapeamento ao contrário: classe da arma -> nome da skill.
+SKILL_BY_WEAPON = {weapon_class: skill_name for skill_name, weapon_class in WEAPON_SKILL_MAP.items()}
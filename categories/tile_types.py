@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import List, Tuple
 
 import tcod
 import numpy as np
@@ -26,15 +26,21 @@ tile_dt = np.dtype(
 )
 
 
+# Records of every tile type, in definition order. Maps store the index into this
+# list (a tile id) instead of the whole record.
+_tile_records: List[Tuple] = []
+
+
 def new_tile(
     *,  # Enforce the use of keywords, so that parameter order doesn't matter.
     walkable: int,
     transparent: int,
     dark: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
     light: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
-) -> np.ndarray:
-    """Helper function for defining individual tile types """
-    return np.array((walkable, transparent, dark, light), dtype=tile_dt)
+) -> np.uint8:
+    """Helper function for defining individual tile types, returns the id of the new tile."""
+    _tile_records.append((walkable, transparent, dark, light))
+    return np.uint8(len(_tile_records) - 1)
 
 # SHROUD represents unexplored, unseen tiles
 SHROUD = np.array((0, (0, 0, 0), (0, 0, 0)), dtype=graphic_dt)
@@ -119,4 +125,7 @@ down_stairs = new_tile(
     transparent=True,
     dark=(304, (220, 220, 220), (0, 0, 0)),
     light=(304, (255, 255, 255), (0, 0, 0)),
-)
\ No newline at end of file
+)
+
+# Palette indexed by tile id: palette[tile_id]["walkable"], palette["light"][tile_ids], etc.
+palette = np.array(_tile_records, dtype=tile_dt)
@@ -1,48 +1,96 @@
 from __future__ import annotations
 
-from typing import List, Optional, Tuple, TYPE_CHECKING
+from collections import deque
+import copy
+import itertools
+from typing import Deque, List, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np  # type: ignore
 import tcod
 import random
 
 from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction
+from flow_field import CROWD_COST
 
 if TYPE_CHECKING:
     from entity import Actor
 
+# Pathfinding only looks at the box around the start and the goal, plus this margin.
+PATH_WINDOW_MARGIN = 8
+# How many times the margin is doubled when no path fits in the window.
+PATH_WINDOW_RETRIES = 3
+# A cached path is kept while its destination moved at most this many tiles...
+PATH_TOLERANCE = 2
+# ...and this many of its next steps are still free.
+PATH_CHECK_STEPS = 3
+
+# Shared cost buffer, grown when a bigger window is needed and reused by every search.
+_cost_buffer = np.zeros(0, dtype=np.int8)
+
+
+def _cost_window(width: int, height: int) -> np.ndarray:
+    """Return a (width, height) int8 array backed by the shared cost buffer."""
+    global _cost_buffer
+    if _cost_buffer.size < width * height:
+        _cost_buffer = np.zeros(width * height * 2, dtype=np.int8)
+    return _cost_buffer[:width * height].reshape(width, height)
+
+
 class BaseAI(Action):
     def perform(self) -> None:
         raise NotImplementedError()
 
+    def instantiate(self, entity: Actor) -> BaseAI:
+        """Return this AI for a new instance of a template actor."""
+        clone = copy.copy(self)
+        clone.entity = entity
+        return clone
+
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """Compute and return a path to the target position.
 
+        The search is limited to a window around the start and the destination, which
+        grows only when no path is found inside it.
         If there is no valid path then returns an empty list.
         """
-        # Copy the walkable array.
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
-
-        for entity in self.entity.gamemap.entities:
+        if (dest_x, dest_y) == (self.entity.x, self.entity.y):
+            return []
+        margin = PATH_WINDOW_MARGIN
+        for _ in range(PATH_WINDOW_RETRIES + 1):
+            path = self._get_path_in_window(dest_x, dest_y, margin)
+            if path:
+                return path
+            margin *= 2
+        return []
+
+    def _get_path_in_window(self, dest_x: int, dest_y: int, margin: int) -> List[Tuple[int, int]]:
+        gamemap = self.entity.gamemap
+        x0 = max(min(self.entity.x, dest_x) - margin, 0)
+        y0 = max(min(self.entity.y, dest_y) - margin, 0)
+        x1 = min(max(self.entity.x, dest_x) + margin + 1, gamemap.width)
+        y1 = min(max(self.entity.y, dest_y) + margin + 1, gamemap.height)
+
+        # Copy the walkable window.
+        cost = _cost_window(x1 - x0, y1 - y0)
+        cost[...] = gamemap.tiles["walkable"].read(x0, y0, x1, y1)
+
+        for entity in gamemap.entity_index.in_rect(x0, y0, x1, y1):
             # Check that an enitiy blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                cost[entity.x, entity.y] += 10
+            if entity.blocks_movement and cost[entity.x - x0, entity.y - y0]:
+                # Add to the cost of a blocked position, the same as the shared flow field does.
+                cost[entity.x - x0, entity.y - y0] += CROWD_COST
 
         # Create a graph from the cost array and pass that graph to a new pathfinder.
         graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
         pathfinder = tcod.path.Pathfinder(graph)
 
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position.
+        pathfinder.add_root((self.entity.x - x0, self.entity.y - y0))  # Start position.
 
         # Compute the path to the destination and remove the starting point.
-        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+        path: List[List[int]] = pathfinder.path_to((dest_x - x0, dest_y - y0))[1:].tolist()
 
-        # Convert from List[List[int]] to List[Tuple[int, int]].
-        return [(index[0], index[1]) for index in path]
+        # Convert from List[List[int]] to List[Tuple[int, int]], back in map coordinates.
+        return [(index[0] + x0, index[1] + y0) for index in path]
 
 class ConfusedEnemy(BaseAI):
     """
@@ -58,6 +106,12 @@ class ConfusedEnemy(BaseAI):
         self.previous_ai = previous_ai
         self.turns_remaining = turns_remaining
 
+    def instantiate(self, entity: Actor) -> ConfusedEnemy:
+        clone = super().instantiate(entity)
+        if self.previous_ai is not None:
+            clone.previous_ai = self.previous_ai.instantiate(entity)
+        return clone
+
     def perform(self) -> None:
         # Revert the AI back to the original state if the effect has run its course.
         if self.turns_remaining <= 0:
@@ -87,24 +141,92 @@ class ConfusedEnemy(BaseAI):
             return BumpAction(self.entity, direction_x, direction_y,).perform()
 
 class HostileEnemy(BaseAI):
+    # Paths reused from the cache and paths computed again, counted over every HostileEnemy.
+    path_hits = 0
+    path_misses = 0
+    # Defaults for saves made before these were kept.
+    path_goal: Optional[Tuple[int, int]] = None
+    last_seen: Optional[Tuple[int, int]] = None
+
     def __init__(self, entity: Actor):
         super().__init__(entity)
-        self.path: List[Tuple[int, int]] = []
+        self.path: Deque[Tuple[int, int]] = deque()
+        self.path_goal: Optional[Tuple[int, int]] = None  # Where self.path leads.
+        # Where the player was last seen, to head there once they are out of sight.
+        self.last_seen: Optional[Tuple[int, int]] = None
+
+    def instantiate(self, entity: Actor) -> HostileEnemy:
+        clone = super().instantiate(entity)
+        clone.path = deque()
+        clone.path_goal = None
+        clone.last_seen = None
+        return clone
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.path = deque(self.path)  # A list in older saves.
+
+    def update_path(self, dest_x: int, dest_y: int) -> None:
+        """Keep the current path if it still leads close enough to (dest_x, dest_y), otherwise compute a new one."""
+        if self.path_is_valid(dest_x, dest_y):
+            HostileEnemy.path_hits += 1
+            return
+        HostileEnemy.path_misses += 1
+        self.path = deque(self.get_path_to(dest_x, dest_y))
+        self.path_goal = dest_x, dest_y
+
+    def path_is_valid(self, dest_x: int, dest_y: int) -> bool:
+        """
+        True if the path ends within PATH_TOLERANCE of the destination, starts next to the entity,
+        and its next PATH_CHECK_STEPS steps are walkable and not blocked by anyone.
+        """
+        if not self.path or self.path_goal is None:
+            return False
+        goal_x, goal_y = self.path_goal
+        if max(abs(goal_x - dest_x), abs(goal_y - dest_y)) > PATH_TOLERANCE:
+            return False
+
+        gamemap = self.entity.gamemap
+        x, y = self.entity.x, self.entity.y
+        for step_x, step_y in itertools.islice(self.path, PATH_CHECK_STEPS):
+            if max(abs(step_x - x), abs(step_y - y)) != 1:
+                return False
+            if not gamemap.tiles["walkable"][step_x, step_y]:
+                return False
+            # The goal itself is where the target stands.
+            if (step_x, step_y) != self.path_goal and gamemap.get_blocking_entity_at_location(step_x, step_y):
+                return False
+            x, y = step_x, step_y
+        return True
 
     def perform(self) -> None:
-        target = self.engine.player
+        engine = self.engine
+        game_map = engine.game_map
+        target = engine.player
         dx = target.x - self.entity.x
         dy = target.y - self.entity.y
-        distance = max(abs(dx), abs(dy))  # Chebyshev distance.
+        # Chebyshev distance and visibility, computed for every actor at the start of the turn.
+        distance, in_fov = game_map.actor_store.turn_values(self.entity, target, game_map.visible)
 
-        if self.engine.game_map.visible[self.entity.x, self.entity.y]:
+        if in_fov:
             if distance <= 1:
                 return MeleeAction(self.entity, dx, dy).perform()
 
-            self.path = self.get_path_to(target.x, target.y)
+            # Step down the distance map shared by every chasing enemy.
+            step = game_map.flow_field.step(self.entity, target)
+            if step is not None:
+                self.path.clear()
+                self.last_seen = target.x, target.y
+                return MovementAction(self.entity, step[0] - self.entity.x, step[1] - self.entity.y).perform()
+
+            self.update_path(target.x, target.y)
+        elif self.last_seen is not None:
+            # Lost sight of the player, find a way to where they were.
+            self.update_path(*self.last_seen)
+            self.last_seen = None
 
         if self.path:
-            dest_x, dest_y = self.path.pop(0)
+            dest_x, dest_y = self.path.popleft()
             return MovementAction(
                 self.entity, dest_x - self.entity.x, dest_y - self.entity.y,
             ).perform()
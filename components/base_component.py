@@ -1,14 +1,21 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import copy
+from typing import TypeVar, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
     from game_map import GameMap
 
+from slotted import Slotted
+
+C = TypeVar("C", bound="BaseComponent")
+
+class BaseComponent(Slotted):
+    # Empty so components that declare slots don't get a __dict__ anyway. Those that don't still have one.
+    __slots__ = ()
 
-class BaseComponent:
     parent: Entity  # Owning entity instance.
 
     @property
@@ -20,3 +27,13 @@ class BaseComponent:
     @property
     def engine(self) -> Engine:
         return self.gamemap.engine
+
+    def instantiate(self: C, parent) -> C:
+        """
+        Return this component for a new instance of a template entity.
+        It is a shallow copy: per-kind data is shared with the template, components
+        with mutable state replace it with fresh objects.
+        """
+        clone = copy.copy(self)
+        clone.parent = parent
+        return clone
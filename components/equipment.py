@@ -1,13 +1,23 @@
 from __future__ import annotations
-from typing import Optional, TYPE_CHECKING
+from typing import NamedTuple, Optional, Type, TYPE_CHECKING
 from components.base_component import BaseComponent
 from categories.equipment_types import EquipmentType
 
 if TYPE_CHECKING:
+    from components.equippable import Equippable
     from entity import Actor, Item
 
 
+class EquipmentBonuses(NamedTuple):
+    defense: int
+    power: int
+    range: int
+    dexterity: int
+
+
 class Equipment(BaseComponent):
+    __slots__ = ("parent", "slots", "_bonuses", "_weapon_class")
+
     parent: Actor
 
     def __init__(self, **slots: Optional[Item]):
@@ -18,6 +28,9 @@ class Equipment(BaseComponent):
         """
         # Initialize all equipment slots as None
         self.slots = {slot: None for slot in EquipmentType}
+        # Both worked out from the slots on first use, and again after an equip or unequip.
+        self._bonuses: Optional[EquipmentBonuses] = None
+        self._weapon_class: Optional[Type[Equippable]] = None
 
         # Assign each passed item to the corresponding slot
         for slot, item in slots.items():
@@ -26,37 +39,65 @@ class Equipment(BaseComponent):
             else:
                 raise ValueError(f"Invalid equipment slot or item: {slot}, {item}")
 
+    def _upgrade(self) -> None:
+        if not hasattr(self, "_bonuses"):
+            self._bonuses = None
+            self._weapon_class = None
+
+    @property
+    def bonuses(self) -> EquipmentBonuses:
+        """The bonuses of the equipped items, summed again only after something is equipped or unequipped."""
+        if self._bonuses is None:
+            self._refresh()
+        return self._bonuses
+
+    @property
+    def weapon_class(self) -> Optional[Type[Equippable]]:
+        """Class of the equippable in the hands (Dagger, Sword...), the key of SKILL_BY_WEAPON."""
+        if self._bonuses is None:
+            self._refresh()
+        return self._weapon_class
+
+    def _refresh(self) -> None:
+        self._bonuses = self._sum_bonuses()
+        weapon = self.slots.get(EquipmentType.HANDS)
+        self._weapon_class = type(weapon.equippable) if weapon and weapon.equippable else None
+
+    def _sum_bonuses(self) -> EquipmentBonuses:
+        defense = power = range = dexterity = 0
+        for item in self.slots.values():
+            if not (item and item.equippable):
+                continue
+            equippable = item.equippable
+            if equippable.equipment_type is EquipmentType.HANDS:
+                power += equippable.power_bonus
+                range += equippable.range
+            else:
+                defense += equippable.defense_bonus
+            dexterity += equippable.dexterity_bonus
+        return EquipmentBonuses(defense, power, range, dexterity)
+
     @property
     def defense_bonus(self) -> int:
-        bonus = 0
-        for slot, item in self.slots.items():
-            if item and item.equippable and item.equippable.equipment_type is not EquipmentType.HANDS:
-                bonus += item.equippable.defense_bonus
-        return bonus
+        return self.bonuses.defense
 
     @property
     def power_bonus(self) -> int:
-        bonus = 0
-        for slot, item in self.slots.items():
-            if item and item.equippable and item.equippable.equipment_type is EquipmentType.HANDS:
-                bonus += item.equippable.power_bonus
-        return bonus
+        return self.bonuses.power
 
     @property
     def range_bonus(self) -> int:
-        bonus = 0
-        for slot, item in self.slots.items():
-            if item and item.equippable and item.equippable.equipment_type is EquipmentType.HANDS:
-                bonus += item.equippable.range
-        return bonus
+        return self.bonuses.range
     
     @property
     def dexterity_bonus(self) -> int:
-        bonus = 0
-        for slot, item in self.slots.items():
-            if item and item.equippable:
-                bonus += item.equippable.dexterity_bonus
-        return bonus
+        return self.bonuses.dexterity
+
+    def instantiate(self, parent: Actor) -> Equipment:
+        clone = super().instantiate(parent)
+        clone.slots = dict.fromkeys(self.slots)  # Filled by Actor.instantiate.
+        clone._bonuses = None
+        return clone
 
     def item_is_equipped(self, item: Item) -> bool:
         # Check if the item is equipped in any slot
@@ -79,6 +120,9 @@ class Equipment(BaseComponent):
             self.unequip_from_slot(slot, add_message)
 
         self.slots[slot] = item
+        self._bonuses = None
+        self.parent.inventory.regroup(item)
+        self.parent.sync()
 
         if add_message:
             self.equip_message(item.name)
@@ -90,6 +134,10 @@ class Equipment(BaseComponent):
             self.unequip_message(current_item.name)
 
         self.slots[slot] = None
+        self._bonuses = None
+        if current_item is not None:
+            self.parent.inventory.regroup(current_item)
+        self.parent.sync()
 
     def toggle_equip(self, equippable_item: Item, add_message: bool = True) -> None:
         print(f"Equippable item: {equippable_item}")
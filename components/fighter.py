@@ -3,23 +3,38 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 import categories.color as color
+import config
 from components.base_component import BaseComponent
+from components.equipment import EquipmentBonuses
 from categories.render_order import RenderOrder
 
 if TYPE_CHECKING:
     from entity import Actor
 
 
+NO_BONUSES = EquipmentBonuses(defense=0, power=0, range=0, dexterity=0)
+
+
 class Fighter(BaseComponent):
+    __slots__ = ("parent", "max_hp", "_hp", "base_defense", "base_power", "base_range", "base_dexterity", "base_speed")
+
     parent: Actor
 
-    def __init__(self, hp: int = 1, base_defense: int = 0, base_power: int = 0, range: int = 0, dexterity: int = 0):
+    def __init__(self, hp: int = 1, base_defense: int = 0, base_power: int = 0, range: int = 0, dexterity: int = 0,
+                 speed: int = 100):
+        if speed <= 0:
+            raise ValueError(f"Fighter speed must be positive, got {speed}.")
         self.max_hp = hp
         self._hp = hp
         self.base_defense = base_defense
         self.base_power = base_power
         self.base_range = range
         self.base_dexterity = dexterity
+        self.base_speed = speed  # 100 is normal speed, 200 acts twice as often.
+
+    def _upgrade(self) -> None:
+        if not hasattr(self, "base_speed"):
+            self.base_speed = 100
 
     @property
     def hp(self) -> int:
@@ -30,6 +45,8 @@ class Fighter(BaseComponent):
         self._hp = max(0, min(value, self.max_hp))
         if self._hp == 0 and self.parent.ai:
             self.die()
+        else:
+            self.parent.sync()
 
     def heal(self, amount: int) -> int:
         if self.hp == self.max_hp:
@@ -44,55 +61,59 @@ class Fighter(BaseComponent):
 
         self.hp = new_hp_value
         if amount_recovered >= 1:
-            self.engine.player.skill_list.skills[3].add_xp(15)
+            self.engine.player.skill_list.gain_xp("First Aid", 15)
         return amount_recovered
 
     def take_damage(self, amount: int) -> None:
         self.hp -= amount
 
+    @property
+    def bonuses(self) -> EquipmentBonuses:
+        """The bonuses of the equipment, cached by Equipment until something is equipped or unequipped."""
+        if self.parent.equipment:
+            return self.parent.equipment.bonuses
+        return NO_BONUSES
+
     @property
     def defense(self) -> int:
-        return self.base_defense + self.defense_bonus
+        return self.base_defense + self.bonuses.defense
 
     @property
     def power(self) -> int:
-        return self.base_power + self.power_bonus
+        return self.base_power + self.bonuses.power
     
     @property
     def range(self) -> int:
-        return self.base_range + self.range_bonus
+        return self.base_range + self.bonuses.range
     
     @property
     def dexterity(self) -> int:
-        return self.base_dexterity + self.dexterity_bonus
+        return self.base_dexterity + self.bonuses.dexterity
+
+    @property
+    def speed(self) -> int:
+        return max(self.base_speed + config.SPEED_PER_DEXTERITY * self.bonuses.dexterity, config.MIN_SPEED)
+
+    @property
+    def action_time(self) -> int:
+        """Game time this actor waits between two actions, at least 1 so the scheduler always moves on."""
+        return max(config.ACTION_TIME * 100 // self.speed, 1)
 
     @property
     def defense_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.defense_bonus
-        else:
-            return 0
+        return self.bonuses.defense
 
     @property
     def power_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.power_bonus
-        else:
-            return 0
+        return self.bonuses.power
 
     @property
     def dexterity_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.dexterity_bonus
-        else:
-            return 0
+        return self.bonuses.dexterity
 
     @property
     def range_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.range_bonus
-        else:
-            return 0
+        return self.bonuses.range
 
     def die(self) -> None:
         if self.engine.player is self.parent:
@@ -108,6 +129,7 @@ class Fighter(BaseComponent):
         self.parent.ai = None
         self.parent.name = f"restos de {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE
+        self.parent.sync()
 
         self.engine.message_log.add_message(death_message, death_message_color)
         
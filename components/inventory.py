@@ -1,34 +1,136 @@
 from __future__ import annotations
 
-from typing import List, TYPE_CHECKING
+from typing import Dict, List, Optional, TYPE_CHECKING
 
 from components.base_component import BaseComponent
+from slotted import defer_upgrade
 
 if TYPE_CHECKING:
     from entity import Actor, Item
 
 
 class Inventory(BaseComponent):
+    """
+    The items an actor carries.
+
+    Besides the `items` list, the total weight, the items grouped by display name
+    and the keys by key_id are kept up to date as items come and go, so reading them is free.
+    Items must be added and removed with `add` and `remove`, and `regroup` called when one is
+    equipped or unequipped.
+    """
+
+    __slots__ = ("parent", "capacity", "max_weight", "items", "groups", "key_items", "_grams", "_labels")
+
     parent: Actor
 
     def __init__(self, capacity: int, max_weight: float):
         self.capacity = capacity
         self.max_weight = max_weight
         self.items: List[Item] = []
+        # Items by their name in the inventory menu ("[E] name" when equipped). Groups are ordered by
+        # where their first item is in `items`, and each group by `items` too, so menu letters stay put.
+        self.groups: Dict[str, List[Item]] = {}
+        # Items with a key_id, by key_id.
+        self.key_items: Dict[int, Item] = {}
+        # Summed in grams, so adding and removing items many times doesn't accumulate float errors.
+        self._grams = 0
+        self._labels: Dict[Item, str] = {}
+
+    def instantiate(self, parent: Actor) -> Inventory:
+        clone = super().instantiate(parent)
+        # Filled by Actor.instantiate.
+        clone.items = []
+        clone.groups = {}
+        clone.key_items = {}
+        clone._grams = 0
+        clone._labels = {}
+        return clone
+
+    def _upgrade(self) -> None:
+        if not hasattr(self, "groups"):
+            # The labels depend on the owner's equipment, which may not be loaded yet.
+            defer_upgrade(self._rebuild)
+
+    def _rebuild(self) -> None:
+        """Work out the weight, groups and keys again from `items`."""
+        items = self.items
+        self.items = []
+        self.groups = {}
+        self.key_items = {}
+        self._grams = 0
+        self._labels = {}
+        for item in items:
+            self.add(item)
+
+    @property
+    def weight(self) -> float:
+        """Total weight of the items, in kg."""
+        return self._grams / 1000
+
+    def can_carry(self, item: Item) -> bool:
+        return self._grams + round(item.weight * 1000) <= round(self.max_weight * 1000)
+
+    def _label(self, item: Item) -> str:
+        equipment = self.parent.equipment
+        return f"[E] {item.name}" if equipment and equipment.item_is_equipped(item) else item.name
+
+    def _group(self, item: Item) -> None:
+        label = self._label(item)
+        self._labels[item] = label
+        self.groups.setdefault(label, []).append(item)
+
+    def _ungroup(self, item: Item) -> None:
+        label = self._labels.pop(item)
+        group = self.groups[label]
+        group.remove(item)
+        if not group:
+            del self.groups[label]
+
+    def _reorder(self, label: Optional[str] = None) -> None:
+        """Sort the groups, and the items of group `label`, back into `items` order."""
+        position = {item: index for index, item in enumerate(self.items)}
+        if label is not None:
+            self.groups[label].sort(key=position.__getitem__)
+        groups = sorted(self.groups.items(), key=lambda group: position[group[1][0]])
+        self.groups.clear()
+        self.groups.update(groups)
+
+    def add(self, item: Item) -> None:
+        self.items.append(item)
+        self._grams += round(item.weight * 1000)
+        self._group(item)
+        if item.key_id is not None:
+            self.key_items[item.key_id] = item
+
+    def remove(self, item: Item) -> None:
+        self.items.remove(item)
+        self._grams -= round(item.weight * 1000)
+        label = self._labels[item]
+        was_first = self.groups[label][0] is item
+        self._ungroup(item)
+        if was_first and label in self.groups:
+            # The group now starts at a later item, which may put it after other groups.
+            self._reorder()
+        if item.key_id is not None and self.key_items.get(item.key_id) is item:
+            del self.key_items[item.key_id]
+            # Another copy of the same key may still be here.
+            for other in reversed(self.items):
+                if other.key_id == item.key_id:
+                    self.key_items[item.key_id] = other
+                    break
+
+    def regroup(self, item: Item) -> None:
+        """File the item under its name again, after it was equipped or unequipped."""
+        if item in self._labels:
+            self._ungroup(item)
+            self._group(item)
+            self._reorder(self._labels[item])
 
     def drop(self, item: Item) -> None:
         """
         Removes an item from the inventory and restores it to the game map, at the player's current location.
         """
-        self.items.remove(item)
+        self.remove(item)
         item.place(self.parent.x, self.parent.y, self.gamemap)
 
         self.engine.message_log.add_message(f"Voce dropa {item.name}.")
-        
-    @property
-    def key_items(self) -> dict[int, Item]:
-        """
-        Retorna um dicionário de itens no inventário que têm um key_id não nulo.
-        A chave do dicionário é o key_id e o valor é o item.
-        """
-        return {item.key_id: item for item in self.items if item.key_id is not None}
\ No newline at end of file
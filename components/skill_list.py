@@ -1,21 +1,56 @@
+from __future__ import annotations
+
+import copy
+
 from components.base_component import BaseComponent
 from skill import Skill  # Corrigido para importar a classe Skill corretamente
-from typing import List, Dict
+from typing import Dict, List, Optional
 from entity import *
 from categories.skills import SKILLS  # Suponho que você tenha uma lista de habilidades em skills.py
 from engine import Engine
 
 class SkillList(BaseComponent):
-    skills = SKILLS
+    _renamed = {"skills": "_skills"}
+
     def __init__(self, parent: Actor, engine: Engine):
-        self.skills: Dict[str, Skill] = {}  # Mapeia o nome da habilidade para o objeto Skill
+        # Mapeia o nome da habilidade para o objeto Skill. Criado no primeiro acesso,
+        # já que a maioria dos atores nunca usa suas habilidades.
+        self._skills: Optional[Dict[str, Skill]] = None
+        # XP ganho no turno por nome da habilidade, aplicado de uma vez por apply_xp no fim do turno.
+        self.pending_xp: Dict[str, int] = {}
         self.parent = parent
         self._engine = engine  # Use uma variável interna para armazenar o engine
-        self.start_skill_list()
-        
-        for skill, value in self.skills.items():
-            self.skills[skill].parent = parent
-            self.skills[skill].engine = engine
+
+    def _upgrade(self) -> None:
+        if not hasattr(self, "pending_xp"):
+            self.pending_xp = {}
+
+    @property
+    def skills(self) -> Dict[str, Skill]:
+        if self._skills is None:
+            self._skills = {}
+            self.start_skill_list()
+        return self._skills
+
+    def instantiate(self, parent: Actor) -> SkillList:
+        clone = super().instantiate(parent)
+        clone._skills = None  # Um novo ator começa com habilidades novas.
+        clone.pending_xp = {}
+        return clone
+
+    def gain_xp(self, name: str, amount: int) -> None:
+        """Guarda XP para a habilidade, aplicado no fim do turno."""
+        self.pending_xp[name] = self.pending_xp.get(name, 0) + amount
+
+    def apply_xp(self) -> None:
+        """Aplica o XP acumulado no turno, subindo quantos níveis forem necessários."""
+        if not self.pending_xp:
+            return
+        for name, amount in self.pending_xp.items():
+            skill = self.skills[name]
+            skill.current_xp += amount
+            skill.increase_level()
+        self.pending_xp.clear()
 
     @property
     def engine(self):
@@ -26,8 +61,9 @@ class SkillList(BaseComponent):
         self._engine = value
 
     def start_skill_list(self):
+        # SKILLS são os modelos, cada ator recebe suas próprias cópias.
         for skill in SKILLS:
-            self.add_skill(skill)
+            self.add_skill(copy.copy(skill))
     
     def add_skill(self, skill: Skill) -> None:
         """Adiciona uma habilidade ao dicionário."""
@@ -11,6 +11,8 @@ if TYPE_CHECKING:
 
 
 class SpawnCurve(BaseComponent):
+    __slots__ = ("parent", "min_prob", "peak_prob", "start_floor", "peak_floor", "end_floor")
+
     parent: Actor
 
     def __init__(self, min_prob: int = 0.0, peak_prob: int = 1.0, start_floor: int = 1, 
@@ -1,2 +1,44 @@
 WORLD_SIZE_X = 8000
-WORLD_SIZE_Y = 4000
\ No newline at end of file
+WORLD_SIZE_Y = 4000
+
+# Side of the square blocks the world map is stored and generated in.
+CHUNK_SIZE = 64
+
+# Verify GameMap's entity position index after every change (slow, meant for tests and debugging).
+CHECK_ENTITY_INDEX = False
+
+# How far the player can see, in tiles.
+FOV_RADIUS = 8
+
+# Actors within this many tiles of the player are woken up and take turns.
+ACTIVE_RADIUS = 24
+# Awake actors farther than this from the player go back to sleep and skip their turns.
+SLEEP_RADIUS = 48
+# Game time between two actions of an actor with speed 100. Faster actors wait proportionally less.
+ACTION_TIME = 100
+# Speed gained per point of dexterity bonus from equipment, and the lowest speed anything can have.
+SPEED_PER_DEXTERITY = 5
+MIN_SPEED = 10
+
+# Loud actions (fights, breaking containers) wake the actors within this many tiles of them.
+NOISE_RADIUS = 16
+
+# Where the game is saved, on quit and by the autosave.
+SAVE_FILE = "savegame.sav"
+
+# Autosave every this many turns, besides on floor changes. 0 disables the periodic autosave.
+AUTOSAVE_INTERVAL = 100
+
+# Seed of the overworld. None picks a random one for every new game, which never reuses the cache below.
+WORLD_SEED = 9329293
+
+# Generated overworld chunks are kept here as .npy files and reused by games with the same seed.
+# None disables the cache.
+WORLD_CACHE_DIR = "world_cache"
+# Blocks of at most this many worlds (one per seed and floor) are kept there, the least recently used are deleted.
+WORLD_CACHE_LIMIT = 8
+
+# Keep the map layers of the current game in memory-mapped files in this directory, so only the
+# parts being used stay in RAM. Meant for small machines. Each map, new or loaded, gets a directory
+# of its own in here, deleted when the map is. None keeps them in memory.
+MAP_LAYERS_DIR = None
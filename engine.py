@@ -1,18 +1,17 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
-import lzma
-import pickle
-import aiofiles  # For asynchronous file handling
 from tcod.console import Console
 from tcod.map import compute_fov
 import tcod
 
+import config
 import exceptions
 from game_map import GameMap
 from message_log import MessageLog
 import render_functions
+import save_container
 
 if TYPE_CHECKING:
     from entity import Actor
@@ -25,6 +24,10 @@ class Engine:
     heal_turn: int = 0
     game_world: GameWorld
     message_log: MessageLog
+    saved_to: Optional[str] = None  # Absolute path of the save file this game was last written to or read from.
+    saved_log_length: int = 0  # Messages in the log at that save.
+    turns: int = 0
+    autosave_pending: bool = False  # Autosave at the end of the next turn, set on floor changes.
 
     def __init__(self, player: Actor, entity_factories: EntityFactories):
         self.message_log = MessageLog
@@ -32,24 +35,83 @@ class Engine:
         self.player = player
         self.message_log = MessageLog()
         self.entity_factories = entity_factories
+        self.saved_to = None
 
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
+        """
+        Run the turns of the actors due before the player's next action.
+
+        The player has just acted at `scheduler.time` and acts again `action_time` later;
+        every actor whose next action falls in between is popped from the scheduler in time
+        order, acts, and is filed again for its own next action.
+        """
+        game_map = self.game_map
+        store = game_map.actor_store
+        scheduler = game_map.scheduler
+        # Distances and visibility for every actor in one pass, read by the AIs below.
+        # Actors far from the player are put to sleep there and skipped until they are woken.
+        store.begin_turn(self.player, game_map.visible, config.ACTIVE_RADIUS, config.SLEEP_RADIUS)
+        game_map.flow_field.invalidate()
+        for entity in store.take_woken():
+            if entity is not self.player:
+                # Filed like an actor that has just acted, so it acts once per action_time from now on.
+                scheduler.schedule(entity, scheduler.time + entity.fighter.action_time)
+
+        player_next = scheduler.time + self.player.fighter.action_time
+        while (entity := scheduler.pop(until=player_next)) is not None:
+            if not store.is_active(entity):
+                continue  # Died or fell asleep, it is filed again when it wakes up.
             if entity.ai:
                 try:
                     entity.ai.perform()
                 except exceptions.Impossible:
                     pass  # Ignore impossible action exceptions from AI.
+            scheduler.schedule(entity, scheduler.time + entity.fighter.action_time)
+        scheduler.time = player_next
+
+    def end_turn(self) -> None:
+        """Called once at the end of every turn the player takes."""
+        self.turns += 1
+        self.player.skill_list.apply_xp()
+        if not self.player.is_alive:
+            return
+        interval = config.AUTOSAVE_INTERVAL
+        if self.autosave_pending or (interval and self.turns % interval == 0):
+            self.autosave()
+
+    def autosave(self) -> None:
+        """
+        Save to `config.SAVE_FILE` in the background. Only the snapshot is taken here,
+        compressing and writing happen in another thread.
+        """
+        self.autosave_pending = False
+        if not save_container.background_saver.save(self, config.SAVE_FILE):
+            self.autosave_pending = True  # The last autosave is still being written, retry next turn.
 
     def update_fov(self) -> None:
-        """Recompute the visible area based on the players point of view."""
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8,
+        """
+        Recompute the visible area based on the players point of view.
+
+        Only the square the FOV radius can reach is read and written, so the cost
+        doesn't depend on the size of the world.
+        """
+        game_map = self.game_map
+        radius = config.FOV_RADIUS
+        x0, y0 = self.player.x - radius, self.player.y - radius
+        x1, y1 = self.player.x + radius + 1, self.player.y + radius + 1
+        fov = compute_fov(
+            game_map.tiles["transparent"].read(x0, y0, x1, y1),
+            (self.player.x - x0, self.player.y - y0),
+            radius=radius,
         )
+
+        # Clip the window to the map, it replaces whatever was visible last turn.
+        left, top = max(x0, 0), max(y0, 0)
+        right, bottom = min(x1, game_map.width), min(y1, game_map.height)
+        fov = fov[left - x0:right - x0, top - y0:bottom - y0]
+        game_map.visible.set_window(left, top, fov)
         # If a tile is "visible" it should be added to "explored".
-        self.game_map.explored |= self.game_map.visible
+        game_map.explored[left:right, top:bottom] |= fov
 
     def render(self, console: Console) -> None:
         if hasattr(self, "game_map"):
@@ -80,7 +142,5 @@ class Engine:
         )
 
     def save_as(self, filename: str) -> None:
-        """Save this Engine instance as a compressed file."""
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(filename, "wb") as f:
-            f.write(save_data)
\ No newline at end of file
+        """Save this Engine instance. Saving again to the same file only rewrites what changed."""
+        save_container.save_engine(self, filename)
\ No newline at end of file
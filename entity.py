@@ -8,6 +8,7 @@ from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union, List
 from categories.render_order import RenderOrder # imports de dentro
 import exceptions
 from game_map import GameMap
+from slotted import Slotted
 
 if TYPE_CHECKING:
     from components.ai import BaseAI
@@ -22,11 +23,14 @@ if TYPE_CHECKING:
 T = TypeVar("T", bound="Entity")
 
 
-class Entity:
+class Entity(Slotted):
     """
     A generic object to represent players, enemies, items, etc.
     """
 
+    # Entities are numerous, so they use slots instead of a __dict__ (see slotted.Slotted).
+    __slots__ = ("x", "y", "char", "color", "name", "blocks_movement", "render_order", "parent")
+
     parent: Union[GameMap, Inventory]
 
     def __init__(
@@ -50,11 +54,11 @@ class Entity:
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
             
     @property
     def key_items(self) -> dict[int, Item]:
-        return {item.key_id: item for item in self.inventory.items if item.key_id is not None}
+        return self.inventory.key_items
     
     @property
     def gamemap(self) -> GameMap:
@@ -62,13 +66,26 @@ class Entity:
             return self.parent
         #raise AttributeError(f"{self.name} não tem um GameMap associado.")
 
+    def instantiate(self: T) -> T:
+        """
+        Return a new instance of this template entity, without a parent.
+
+        Unlike a deep copy, per-kind data (name, glyph, color, item and spawn parameters)
+        is shared with the template and only mutable state, like HP, AI state and
+        inventory contents, gets new objects. See `BaseComponent.instantiate`.
+        """
+        clone = copy.copy(self)
+        if hasattr(clone, "parent"):
+            del clone.parent
+        return clone
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
-        """Spawn a copy of this instance at the given location."""
-        clone = copy.deepcopy(self)
+        """Spawn a new instance of this template at the given location."""
+        clone = self.instantiate()
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
 
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
@@ -77,9 +94,9 @@ class Entity:
         if hasattr(self, "parent") and self.parent is not None:
             if isinstance(self.parent, GameMap):
                 if self.parent.entities.__contains__(self):
-                    self.parent.entities.remove(self)
+                    self.parent.remove_entity(self)
         self.parent = gamemap
-        gamemap.entities.add(self)
+        gamemap.add_entity(self)
 
     def distance(self, x: int, y: int) -> float:
         """
@@ -91,8 +108,12 @@ class Entity:
         # Move the entity by a given amount
         self.x += dx
         self.y += dy
+        if isinstance(self.parent, GameMap):
+            self.parent.update_entity(self)
 
 class Actor(Entity):
+    __slots__ = ("ai", "fighter", "spawn_curve", "equipment", "inventory", "skill_list")
+
     def __init__(
         self,
         *,
@@ -141,6 +162,34 @@ class Actor(Entity):
         self.skill_list = skill_list
         self.skill_list.parent = self
 
+    def instantiate(self) -> Actor:
+        clone = super().instantiate()
+        clone.ai = None if self.ai is None else self.ai.instantiate(clone)
+        clone.fighter = self.fighter.instantiate(clone)
+        # The spawn curve is per kind, so it stays shared with the template.
+        clone.equipment = self.equipment.instantiate(clone)
+        clone.inventory = self.inventory.instantiate(clone)
+        clone.skill_list = self.skill_list.instantiate(clone)
+
+        # Equipped items are usually also in the inventory, and must stay the same object there.
+        items = {}
+        for item in self.inventory.items:
+            items[item] = item.instantiate()
+            items[item].parent = clone.inventory
+        for slot, item in self.equipment.slots.items():
+            if item is not None:
+                clone.equipment.slots[slot] = items.get(item) or item.instantiate()
+        # Added after equipping, so equipped items are grouped as such.
+        for item in items.values():
+            clone.inventory.add(item)
+        return clone
+
+    def sync(self) -> None:
+        """Copy HP, stats and the alive state into the ActorStore of this actor's map, after they change."""
+        gamemap = getattr(self, "parent", None)
+        if isinstance(gamemap, GameMap) and self in gamemap.actor_store:
+            gamemap.actor_store.update(self)
+
     @property
     def is_alive(self) -> bool:
         """Retorna True enquanto esse ator pode realizar ações."""
@@ -156,6 +205,8 @@ class Actor(Entity):
         return True
     
 class Item(Entity):
+    __slots__ = ("consumable", "equippable", "weight", "key_id")
+
     def __init__(
         self,
         *,
@@ -188,7 +239,17 @@ class Item(Entity):
         self.weight = weight
         self.key_id = key_id
 
+    def instantiate(self) -> Item:
+        clone = super().instantiate()
+        if self.consumable is not None:
+            clone.consumable = self.consumable.instantiate(clone)
+        if self.equippable is not None:
+            clone.equippable = self.equippable.instantiate(clone)
+        return clone
+
 class Chest(Entity):
+    __slots__ = ("locked", "breakable", "chest_id", "items")
+
     def __init__(
         self,
         *,
@@ -217,6 +278,11 @@ class Chest(Entity):
         self.chest_id = chest_id
         self.items = items or []
 
+    def instantiate(self) -> Chest:
+        clone = super().instantiate()
+        clone.items = [item.instantiate() for item in self.items]
+        return clone
+
     def open(self, actor: Actor) -> List[Item]:
         """
         Tenta abrir o baú.
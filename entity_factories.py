@@ -84,7 +84,8 @@ class EntityFactories:
                 equipment=Equipment(),
                 fighter=Fighter(hp=enemy_data["fighter"]["hp"], 
                                 base_defense=enemy_data["fighter"]["base_defense"], 
-                                base_power=enemy_data["fighter"]["base_power"]),
+                                base_power=enemy_data["fighter"]["base_power"],
+                                speed=enemy_data["fighter"].get("speed", 100)),
                 inventory=Inventory(capacity=enemy_data["inventory"]["capacity"], 
                                      max_weight=enemy_data["inventory"]["max_weight"]),
                 skill_list=SkillList(parent=gamemap, engine=engine),
@@ -5,4 +5,10 @@ class Impossible(Exception):
     """
 
 class QuitWithoutSaving(SystemExit):
-    """Can be raised to exit the game without automatically saving."""
\ No newline at end of file
+    """Can be raised to exit the game without automatically saving."""
+
+class GenerationCancelled(Exception):
+    """Raised inside world generation when the player cancels a new game."""
+
+class IncompatibleSave(Exception):
+    """Raised when a save file was written in a format this version of the game can't read."""
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+import tcod
+
+if TYPE_CHECKING:
+    from entity import Actor
+    from game_map import GameMap
+
+# Extra cost of a tile with a blocking entity on it. A lower number means more enemies will
+# crowd behind each other in hallways, a higher number means enemies will take longer paths
+# in order to surround the player.
+CROWD_COST = 10
+
+NEIGHBOURS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+class FlowField:
+    """
+    A Dijkstra distance map rooted at the player, shared by every enemy chasing them.
+
+    It covers the square of `radius` tiles around the player and is computed the first time
+    an enemy asks for a step after `invalidate`, so a turn costs one search however many
+    enemies are chasing. Each enemy then walks downhill on it with `step`.
+    """
+
+    def __init__(self, gamemap: GameMap, radius: int):
+        self.gamemap = gamemap
+        self.radius = radius
+        self.root: Optional[Tuple[int, int]] = None
+        self.origin = (0, 0)
+        self.distance: Optional[np.ndarray] = None
+
+    def __getstate__(self) -> dict:
+        # Only valid for one turn, no point in saving it.
+        state = self.__dict__.copy()
+        state["root"] = state["distance"] = None
+        return state
+
+    def invalidate(self) -> None:
+        """Forget the field, called when the entities have moved."""
+        self.root = None
+        self.distance = None
+
+    def _compute(self, target: Actor) -> None:
+        gamemap = self.gamemap
+        x0, y0 = max(target.x - self.radius, 0), max(target.y - self.radius, 0)
+        x1 = min(target.x + self.radius + 1, gamemap.width)
+        y1 = min(target.y + self.radius + 1, gamemap.height)
+
+        cost = gamemap.tiles["walkable"].read(x0, y0, x1, y1).astype(np.int16)
+        for entity in gamemap.entity_index.in_rect(x0, y0, x1, y1):
+            if entity.blocks_movement and cost[entity.x - x0, entity.y - y0]:
+                cost[entity.x - x0, entity.y - y0] += CROWD_COST
+
+        distance = tcod.path.maxarray(cost.shape, dtype=np.int32)
+        distance[target.x - x0, target.y - y0] = 0
+        tcod.path.dijkstra2d(distance, cost, 2, 3, out=distance)
+
+        self.root = target.x, target.y
+        self.origin = x0, y0
+        self.distance = distance
+
+    def step(self, entity: Actor, target: Actor) -> Optional[Tuple[int, int]]:
+        """
+        Return the free tile next to `entity` that is closest to `target` along the field.
+        Returns None if `entity` is outside the field, or every tile closer to the target is taken.
+        """
+        if self.root != (target.x, target.y):
+            self._compute(target)
+        distance = self.distance
+        x0, y0 = self.origin
+        width, height = distance.shape
+        x, y = entity.x - x0, entity.y - y0
+        if not (0 <= x < width and 0 <= y < height):
+            return None
+
+        best = None
+        best_distance = distance[x, y]  # Unreachable tiles stay at the maximum, so they are never taken.
+        for dx, dy in NEIGHBOURS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height and distance[nx, ny] < best_distance:
+                # The field was computed at the start of the turn, others may have moved in since.
+                if self.gamemap.get_blocking_entity_at_location(nx + x0, ny + y0) is None:
+                    best, best_distance = (nx + x0, ny + y0), distance[nx, ny]
+        return best
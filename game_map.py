@@ -4,33 +4,129 @@ from typing import Iterable, Iterator, Optional, TYPE_CHECKING
 import numpy as np  # type: ignore
 from tcod.console import Console
 import gc
+import os
+import random
+import shutil
+import tempfile
+import weakref
 
 import categories.tile_types as tile_types
+import config
 import entity as ENT
+from actor_store import ActorStore
+from flow_field import FlowField
+from map_chunks import ChunkedBitset, ChunkedTiles, ChunkGenerator, VisibleWindow
+from scheduler import TurnScheduler
+from slotted import defer_upgrade
+from spatial_index import SpatialIndex
 
 if TYPE_CHECKING:
     from entity import Entity, Actor, Item
     from engine import Engine
+    from procgen import ProgressCallback
+
+def _delete_layers(directory: str, stores: Iterable[ChunkedTiles]) -> None:
+    # Windows can't delete a file that is still mapped, so the stores let go of theirs first.
+    for store in stores:
+        store.release_backing()
+    shutil.rmtree(directory, ignore_errors=True)
+
 
 class GameMap:
     def __init__(
-        self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()
+        self,
+        engine: Engine,
+        width: int,
+        height: int,
+        entities: Iterable[Entity] = (),
+        tile_generator: Optional[ChunkGenerator] = None,
+        layers_root: Optional[str] = None,
     ):
         print (f"\n - Initializing GameMap...")
         self.engine = engine
         self.width, self.height = width, height
         self.entities = set(entities)
-        self.tiles = np.full((width, height), fill_value=tile_types.wall_stone, order="F")
+        # Entities by position, kept in sync through add_entity, remove_entity and update_entity.
+        self.entity_index = SpatialIndex(self.entities)
+        # Actors as NumPy columns for per-turn batch work, kept in sync the same way and by Actor.sync.
+        self.actor_store = ActorStore(entity for entity in self.entities if isinstance(entity, ENT.Actor))
+        # When each awake actor acts next, filled by Engine.handle_enemy_turns as actors wake up.
+        self.scheduler = TurnScheduler()
+        # Distances to the player, shared by the enemies chasing them. Recomputed every enemy turn.
+        self.flow_field = FlowField(self, config.ACTIVE_RADIUS)
+        # Tiles are stored in chunks that are generated the first time they are read,
+        # so memory grows with the area the player has been around, not with the world size.
+        # Each cell is a uint8 tile id, walkable/transparent/graphics are read from tile_types.palette.
+        # With `layers_root` the chunks are kept in memory-mapped files instead of the heap,
+        # in a directory of this map's own inside it, so two games never write the same files.
+        self.layers_dir = None if layers_root is None else self.make_layers_dir(layers_root)
+        self.tiles = ChunkedTiles(
+            width, height, fill_value=tile_types.wall_stone, generator=tile_generator, palette=tile_types.palette,
+            memmap_path=self.layer_path("tiles"),
+        )
 
-        self.visible = np.full(
-            (width, height), fill_value=False, order="F"
-        )  # Tiles the player can currently see
-        self.explored = np.full(
-            (width, height), fill_value=False, order="F"
-        )  # Tiles the player has seen before
+        # Tiles the player can currently see, only the last FOV window is stored.
+        self.visible = VisibleWindow(width, height)
+        # Tiles the player has seen before, one bit per tile in chunks that exist once something in them was seen.
+        self.explored = ChunkedBitset(width, height, memmap_path=self.layer_path("explored"))
+        if self.layers_dir is not None:
+            self.delete_layers_with_map()
 
         self.downstairs_location = (0, 0)
-        print (f" - GameMap Initialized, {len(self.tiles)} tiles...")
+        print (f" - GameMap Initialized, {width * height} tiles in chunks of {self.tiles.chunk_size}...")
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        # Saves made before these were kept only have the entities, the rest is built again.
+        if "scheduler" not in state:
+            self.scheduler = TurnScheduler()
+        if "flow_field" not in state:
+            self.flow_field = FlowField(self, config.ACTIVE_RADIUS)
+        if "entity_index" not in state or "actor_store" not in state:
+            # Positions and stats are read from the entities, which may not be loaded yet.
+            defer_upgrade(self._rebuild_indexes)
+        if isinstance(self.tiles, np.ndarray):
+            self._chunk_dense_layers()
+        # The saved files belong to the game that was saved, which may still be running.
+        self.layers_dir = None if config.MAP_LAYERS_DIR is None else self.make_layers_dir(config.MAP_LAYERS_DIR)
+        if self.layers_dir is not None:
+            self.tiles.map_to(self.layer_path("tiles"))
+            self.explored.map_to(self.layer_path("explored"))
+            self.delete_layers_with_map()
+
+    def _chunk_dense_layers(self) -> None:
+        """Convert the whole-map arrays of saves made before maps were chunked."""
+        records, explored = self.tiles, self.explored
+        # Those tiles are full records, matched back to their tile ids.
+        tile_ids = np.full(records.shape, tile_types.floor_error, dtype=np.uint8, order="F")
+        for tile_id, record in enumerate(tile_types.palette):
+            tile_ids[records == record] = tile_id
+        self.tiles = ChunkedTiles(self.width, self.height, fill_value=tile_types.wall_stone, palette=tile_types.palette)
+        self.tiles.write(0, 0, tile_ids)
+        self.visible = VisibleWindow(self.width, self.height)  # Filled by the next update_fov.
+        self.explored = ChunkedBitset(self.width, self.height)
+        self.explored.write(0, 0, explored)
+
+    def _rebuild_indexes(self) -> None:
+        if not hasattr(self, "entity_index"):
+            self.entity_index = SpatialIndex(self.entities)
+        if not hasattr(self, "actor_store"):
+            self.actor_store = ActorStore(entity for entity in self.entities if isinstance(entity, ENT.Actor))
+
+    def make_layers_dir(self, root: str) -> str:
+        """Create a new directory in `root` for the layer files of this map."""
+        os.makedirs(root, exist_ok=True)
+        return tempfile.mkdtemp(prefix="map_", dir=root)
+
+    def delete_layers_with_map(self) -> None:
+        """Delete `layers_dir` when this map is garbage collected, or at exit."""
+        weakref.finalize(self, _delete_layers, self.layers_dir, (self.tiles, self.explored))
+
+    def layer_path(self, name: str) -> Optional[str]:
+        """File of the memory-mapped layer `name`, or None if layers are kept in memory."""
+        if self.layers_dir is None:
+            return None
+        return os.path.join(self.layers_dir, f"{name}.dat")
 
     @property
     def actors(self) -> Iterator[ENT.Actor]:
@@ -42,23 +138,69 @@ class GameMap:
         """Iterate over items on this map."""
         yield from (entity for entity in self.entities if isinstance(entity, ENT.Item))
 
+    def add_entity(self, entity: Entity) -> None:
+        """Add an entity to this map and to the position index."""
+        self.entities.add(entity)
+        self.entity_index.add(entity)
+        if isinstance(entity, ENT.Actor):
+            self.actor_store.add(entity)
+        self.check_entity_index()
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Remove an entity from this map and from the position index."""
+        self.entities.remove(entity)
+        self.entity_index.remove(entity)
+        self.actor_store.discard(entity)
+        self.scheduler.unschedule(entity)
+        self.check_entity_index()
+
+    def update_entity(self, entity: Entity) -> None:
+        """Refile an entity in the position index after its x/y changed."""
+        self.entity_index.update(entity)
+        if entity in self.actor_store:
+            self.actor_store.move(entity)
+        self.check_entity_index()
+
+    def make_noise(self, x: int, y: int, radius: int) -> None:
+        """Wake the sleeping actors within `radius` tiles of (x, y)."""
+        self.actor_store.wake_near(x, y, radius)
+
+    def check_entity_index(self, force: bool = False) -> None:
+        """Verify the position index against the entities, if config.CHECK_ENTITY_INDEX is on (or `force`)."""
+        if force or config.CHECK_ENTITY_INDEX:
+            self.entity_index.check(self.entities)
+            self.actor_store.check(entity for entity in self.entities if isinstance(entity, ENT.Actor))
+
+    def get_entities_at_location(self, x: int, y: int) -> list[Entity]:
+        """Get every entity at a location."""
+        return list(self.entity_index.at(x, y))
+
     def get_blocking_entity_at_location(self, x: int, y: int) -> Optional[Entity]:
         """Get a blocking entity at a location."""
-        return next(
-            (entity for entity in self.entities if entity.blocks_movement and entity.x == x and entity.y == y),
-            None,
-        )
+        return next((entity for entity in self.entity_index.at(x, y) if entity.blocks_movement), None)
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
         """Get an actor at a specific location."""
-        return next((actor for actor in self.actors if actor.x == x and actor.y == y), None)
+        return next(
+            (
+                entity for entity in self.entity_index.at(x, y)
+                if isinstance(entity, ENT.Actor) and entity.is_alive
+            ),
+            None,
+        )
 
     def get_locations_of_tile(self, tile_type) -> list[tuple[int, int]]:
         """
-        Return a list of all locations in the map that have the specified tile type.
+        Return a list of all locations in the map that have the specified tile type (a tile id).
+        Only chunks that were already generated are searched.
         """
         print (f" - Getting list of all locations in the map that have {tile_type} tiles...")
-        LIST = [tuple(loc) for loc in np.argwhere(self.tiles == tile_type)]
+        LIST = []
+        size = self.tiles.chunk_size
+        for (cx, cy), chunk in self.tiles.items():
+            for x, y in np.argwhere(chunk == tile_type):
+                if self.in_bounds(cx * size + x, cy * size + y):
+                    LIST.append((int(cx * size + x), int(cy * size + y)))
         return LIST
 
     def in_bounds(self, x: int, y: int) -> bool:
@@ -72,27 +214,19 @@ class GameMap:
         # Preenche todo o console com SHROUD antes de renderizar
         console.rgb[:, :] = tile_types.SHROUD
 
-        # Define os limites do console
-        console_width, console_height = console.width, console.height
-
-        # Itera sobre cada posição do console
-        for x in range(console_width):
-            for y in range(console_height):
-                # Calcula a posição no mapa correspondente ao console (ajustada pelo offset)
-                map_x = x + offset_x
-                map_y = y + offset_y
+        # Janela do mapa coberta pelo console, cortada nas bordas do mapa.
+        left, top = max(offset_x, 0), max(offset_y, 0)
+        right = min(offset_x + console.width, self.width)
+        bottom = min(offset_y + console.height, self.height)
 
-                # Verifica se a posição está dentro dos limites do mapa
-                if 0 <= map_x < self.width and 0 <= map_y < self.height:
-                    if self.visible[map_x, map_y]:
-                        tile = self.tiles["light"][map_x, map_y]
-                    elif self.explored[map_x, map_y]:
-                        tile = self.tiles["dark"][map_x, map_y]
-                    else:
-                        tile = tile_types.SHROUD
-
-                    # Atualiza a posição do console com o tile correspondente
-                    console.rgb[x, y] = tile
+        if left < right and top < bottom:
+            tile_ids = self.tiles.read(left, top, right, bottom)
+            # Escolhe light, dark ou SHROUD para a janela inteira de uma vez.
+            console.rgb[left - offset_x:right - offset_x, top - offset_y:bottom - offset_y] = np.select(
+                condlist=[self.visible.read(left, top, right, bottom), self.explored.read(left, top, right, bottom)],
+                choicelist=[tile_types.palette["light"][tile_ids], tile_types.palette["dark"][tile_ids]],
+                default=tile_types.SHROUD,
+            )
 
         # Ordena as entidades com base no render_order
         sorted_entities = sorted(self.entities, key=lambda entity: entity.render_order.value)
@@ -118,6 +252,9 @@ class GameWorld:
     Holds the settings for the GameMap and generates new maps when moving down the stairs.
     """
 
+    # Default for saves made before the seed was kept, every floor was generated from this one.
+    seed: int = 9329293
+
     def __init__(
         self,
         *,
@@ -130,8 +267,11 @@ class GameWorld:
         max_monsters_per_room: int,
         max_items_per_room: int,
         current_floor: int = 0,
+        seed: Optional[int] = None,
     ):
         self.engine = engine
+        # Every floor is generated from this seed, a random one is picked if not given.
+        self.seed = random.randint(1, 9999999) if seed is None else seed
         self.map_width = map_width
         self.map_height = map_height
         self.max_rooms = max_rooms
@@ -141,8 +281,11 @@ class GameWorld:
         self.max_items_per_room = max_items_per_room
         self.current_floor = current_floor
 
-    def generate_floor(self) -> None:
-        """Generate a new floor, increasing the floor count."""
+    def generate_floor(self, progress: Optional[ProgressCallback] = None) -> None:
+        """
+        Generate a new floor, increasing the floor count.
+        `progress` is passed on to the generator, see `procgen.ProgressCallback`.
+        """
         from procgen import generate_overworld
 
         self.current_floor += 1
@@ -150,8 +293,15 @@ class GameWorld:
         # Limpa o mapa anterior para evitar referências persistentes.
         if hasattr(self.engine, "game_map"):
             self.engine.game_map.entities.clear()
+            self.engine.game_map.entity_index.clear()
+            self.engine.game_map.actor_store.clear()
+            self.engine.game_map.scheduler.clear()
             del self.engine.game_map
 
+        # A new map shares no chunks with the saved one, so the next save is written from scratch.
+        self.engine.saved_to = None
+        self.engine.autosave_pending = True
+
         gc.collect()
         for obj in gc.garbage:
             print(obj)
@@ -162,6 +312,7 @@ class GameWorld:
             map_width=self.map_width,
             map_height=self.map_height,
             engine=self.engine,
-            seed=9329293,
-            noise_scale=1.0,
+            seed=self.seed + self.current_floor - 1,  # The first floor uses the world seed itself.
+            progress=progress,
+            layers_root=config.MAP_LAYERS_DIR,
         )
\ No newline at end of file
@@ -14,7 +14,9 @@ from actions import (
     WaitAction
 )
 import categories.color as color
+import config
 import exceptions
+import save_container
 
 if TYPE_CHECKING:
     from engine import Engine
@@ -88,6 +90,9 @@ MainGameEventHandler will become the active handler.
 
 
 class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
+    # Seconds the main loop waits for input before rendering again. None waits for an event.
+    wait_timeout: Optional[float] = None
+
     def handle_events(self, event: tcod.event.Event) -> BaseEventHandler:
         """Handle an event and return the next active event handler."""
         state = self.dispatch(event)
@@ -99,6 +104,10 @@ class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
     def on_render(self, console: tcod.Console) -> None:
         raise NotImplementedError()
 
+    def poll(self) -> BaseEventHandler:
+        """Called once per frame, even without events. Return the next active event handler."""
+        return self
+
     def ev_quit(self, event: tcod.event.Quit) -> Optional[ActionOrHandler]:
         raise SystemExit()
 
@@ -136,6 +145,7 @@ class EventHandler(BaseEventHandler):
         self.engine.handle_enemy_turns()
 
         self.engine.update_fov()
+        self.engine.end_turn()
         return True
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
@@ -214,14 +224,7 @@ class InventoryEventHandler(AskUserEventHandler):
 
     def group_inventory_items(self) -> list[tuple[str, Item, int]]:
         """Group inventory items by name, preserving their order and count."""
-        grouped = {}
-        for item in self.engine.player.inventory.items:
-            key = f"[E] {item.name}" if self.engine.player.equipment.item_is_equipped(item) else item.name
-            if key in grouped:
-                grouped[key]["count"] += 1
-            else:
-                grouped[key] = {"item": item, "count": 1}
-        return [(name, data["item"], data["count"]) for name, data in grouped.items()]
+        return [(name, items[0], len(items)) for name, items in self.engine.player.inventory.groups.items()]
 
     def on_render(self, console: tcod.Console) -> None:
         """Render the inventory menu."""
@@ -230,7 +233,7 @@ class InventoryEventHandler(AskUserEventHandler):
         height = len(self.grouped_items) + 3
         height = max(height, 3)
         inventory = self.engine.player.inventory
-        total_weight = sum(item.weight for item in inventory.items)
+        total_weight = inventory.weight
         max_weight = inventory.max_weight
 
         x = 40 if self.engine.player.x <= 30 else 0
@@ -507,8 +510,9 @@ class MainGameEventHandler(EventHandler):
 class GameOverEventHandler(EventHandler):
     def on_quit(self) -> None:
         """Handle exiting out of a finished game."""
-        if os.path.exists("savegame.sav"):
-            os.remove("savegame.sav")  # Deletes the active save file.
+        save_container.background_saver.wait()  # An autosave still being written would recreate the file.
+        if os.path.exists(config.SAVE_FILE):
+            os.remove(config.SAVE_FILE)  # Deletes the active save file.
         raise exceptions.QuitWithoutSaving()  # Avoid saving a finished game.
 
     def ev_quit(self, event: tcod.event.Quit) -> None:
@@ -530,7 +534,7 @@ class HistoryViewer(EventHandler):
 
     def __init__(self, engine: Engine):
         super().__init__(engine)
-        self.log_length = len(engine.message_log.messages)
+        self.log_length = engine.message_log.length
         self.cursor = self.log_length - 1
 
     def on_render(self, console: tcod.Console) -> None:
@@ -545,13 +549,16 @@ class HistoryViewer(EventHandler):
         )
 
         # Render the message log using the cursor parameter.
-        self.engine.message_log.render_messages(
+        # Messages take a line or more, so only the ones that fit above the cursor are read from the save.
+        log = self.engine.message_log
+        log.load_from(self.cursor + 1 - (log_console.height - 2))
+        log.render_messages(
             log_console,
             1,
             1,
             log_console.width - 2,
             log_console.height - 2,
-            self.engine.message_log.messages[: self.cursor + 1],
+            log.messages[: self.cursor + 1 - log.first_index],
         )
         log_console.blit(console, 3, 3)
 
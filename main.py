@@ -4,6 +4,7 @@ import traceback
 import tcod
 
 import categories.color as color
+import config
 import exceptions
 import input_handlers
 import setup_game
@@ -39,9 +40,10 @@ def main() -> None:
                 context.present(root_console)
 
                 try:
-                    for event in tcod.event.wait():
+                    for event in tcod.event.wait(timeout=handler.wait_timeout):
                         context.convert_event(event)
                         handler = handler.handle_events(event)
+                    handler = handler.poll()
                 except Exception:  # Handle exceptions in game.
                     traceback.print_exc()  # Print error to stderr.
                     # Then print the error to the message log.
@@ -52,10 +54,10 @@ def main() -> None:
         except exceptions.QuitWithoutSaving:
             raise
         except SystemExit:  # Save and quit.
-            save_game(handler, "savegame.sav")
+            save_game(handler, config.SAVE_FILE)
             raise
         except BaseException:  # Save on any other unexpected exception.
-            save_game(handler, "savegame.sav")
+            save_game(handler, config.SAVE_FILE)
             raise
     
 if __name__ == "__main__":
@@ -0,0 +1,464 @@
+from __future__ import annotations
+
+import os
+from typing import Callable, Dict, Iterator, Optional, Protocol, Set, Tuple, Union
+
+import numpy as np  # type: ignore
+
+import config
+
+ChunkKey = Tuple[int, int]
+ChunkGenerator = Callable[[int, int, int, int], np.ndarray]
+"""Callable receiving (x, y, width, height) of a block and returning its contents."""
+
+
+class ChunkSource(Protocol):
+    """Chunks stored elsewhere (like a save file) that are only read when first needed."""
+
+    keys: Set[ChunkKey]  # Chunks not read yet.
+
+    def load(self, key: ChunkKey) -> np.ndarray:
+        """Read the chunk at `key` and remove it from `keys`."""
+
+
+def index_region(key, shape: Tuple[int, int]) -> Union[Tuple[int, int], Tuple[int, int, int, int]]:
+    """Convert a 2D index into either a point (x, y) or a region (x0, y0, x1, y1)."""
+    if not isinstance(key, tuple) or len(key) != 2:
+        raise IndexError(f"Chunked maps need a 2D index, got {key!r}.")
+    bounds = []
+    is_point = True
+    for index, length in zip(key, shape):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(length)
+            if step != 1:
+                raise IndexError("Chunked maps don't support stepped slices.")
+            bounds.append((start, stop))
+            is_point = False
+        else:
+            index = int(index)
+            if not 0 <= index < length:
+                raise IndexError(f"Index {index} out of bounds for size {length}.")
+            bounds.append((index, index + 1))
+    (x0, x1), (y0, y1) = bounds
+    if is_point:
+        return x0, y0
+    return x0, y0, x1, y1
+
+
+def drop_point_axes(block: np.ndarray, key) -> np.ndarray:
+    """Remove the axes indexed by an integer, like NumPy does for `array[3, 0:10]`."""
+    return block[tuple(slice(None) if isinstance(k, slice) else 0 for k in key)]
+
+
+class ChunkedTiles:
+    """
+    A 2D array split into square chunks that are only allocated when touched.
+
+    Chunks are keyed by chunk coordinate `(x // chunk_size, y // chunk_size)`.
+    When a chunk that doesn't exist yet is read, `generator` is called to fill it
+    (or `fill_value` is used if there is no generator).
+    Indexing mimics the dense NumPy array it replaces:
+    `tiles[x, y]`, `tiles[x0:x1, y0:y1]` and `tiles["walkable"][x, y]` all work.
+
+    If a `palette` is given the chunks hold indexes into it (tile ids) and
+    field lookups like `tiles["walkable"]` go through the palette.
+
+    `dirty` holds the keys of the chunks created or written since it was last cleared,
+    so a save only has to rewrite those.
+
+    With `memmap_path` the chunks live in a memory-mapped file instead of the heap, one
+    contiguous slot per chunk, so the OS only keeps the pages of recently used chunks resident.
+    The file is scratch space that belongs to this object: a pickled copy keeps its chunks on
+    the heap until `map_to` gives it a file of its own (GameMap does so on load).
+
+    With a `source` (set when loading a game), chunks in `source.keys` exist but are only
+    read from it when first touched, before falling back to the generator.
+    """
+
+    memmap_path: Optional[str] = None
+    backing: Optional[np.memmap] = None
+    source: Optional[ChunkSource] = None
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        fill_value,
+        generator: Optional[ChunkGenerator] = None,
+        chunk_size: int = config.CHUNK_SIZE,
+        palette: Optional[np.ndarray] = None,
+        memmap_path: Optional[str] = None,
+    ):
+        self.width, self.height = width, height
+        self.fill_value = np.asarray(fill_value)
+        self.dtype = self.fill_value.dtype
+        self.generator = generator
+        self.chunk_size = chunk_size
+        self.palette = palette
+        self.chunks: Dict[ChunkKey, np.ndarray] = {}
+        self.dirty: Set[ChunkKey] = set()
+        self.memmap_path = memmap_path
+        if memmap_path is not None:
+            self._open_backing()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # The file stays with this object, reopening it from a copy would overwrite it.
+        state["backing"] = state["memmap_path"] = None
+        state["source"] = None  # Belongs to the file this map was loaded from.
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.memmap_path = None  # Older saves still have the path of the file they were saved from.
+
+    def map_to(self, path: str) -> None:
+        """Keep the chunks in a new memory-mapped file at `path` from now on."""
+        self.memmap_path = path
+        self._open_backing()
+        for key, chunk in list(self.chunks.items()):
+            self._store(key, chunk)
+
+    def release_backing(self) -> None:
+        """Close the memory-mapped file, so it can be deleted. The chunks in it are dropped with it."""
+        if self.backing is None:
+            return
+        self.chunks.clear()
+        self.dirty.clear()
+        self.backing = None
+        self.memmap_path = None
+
+    @property
+    def slot_shape(self) -> Tuple[int, ...]:
+        """Shape of one stored chunk."""
+        return self.chunk_size, self.chunk_size
+
+    @property
+    def slot_dtype(self) -> np.dtype:
+        """Data type of one stored chunk."""
+        return self.dtype
+
+    def _open_backing(self) -> None:
+        """Create the memory-mapped file, with a slot for every chunk of the map."""
+        directory = os.path.dirname(self.memmap_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        columns = -(-self.width // self.chunk_size)
+        rows = -(-self.height // self.chunk_size)
+        # Fortran order keeps each slot contiguous, and the slots untouched so far are never paged in.
+        self.backing = np.memmap(
+            self.memmap_path, dtype=self.slot_dtype, mode="w+", shape=self.slot_shape + (columns, rows), order="F"
+        )
+
+    def _store(self, key: ChunkKey, chunk: np.ndarray) -> np.ndarray:
+        """Keep `chunk` as the chunk at `key`, copying it into its memory-mapped slot if there is one."""
+        if self.backing is not None:
+            slot = self.backing[(slice(None),) * len(self.slot_shape) + key]
+            slot[...] = chunk
+            chunk = slot
+        self.chunks[key] = chunk
+        return chunk
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the allocated chunks, not counting the ones still in `source`."""
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    def __len__(self) -> int:
+        return self.width
+
+    def chunk_of(self, x: int, y: int) -> ChunkKey:
+        """Return the key of the chunk containing the map position (x, y)."""
+        return x // self.chunk_size, y // self.chunk_size
+
+    def chunk(self, cx: int, cy: int) -> np.ndarray:
+        """Return the chunk at chunk coordinate (cx, cy), generating it if needed."""
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None:
+            chunk = self._hydrate((cx, cy))
+        if chunk is None:
+            chunk = self._store((cx, cy), self._new_chunk(cx, cy))
+            self.dirty.add((cx, cy))
+        return chunk
+
+    def _hydrate(self, key: ChunkKey) -> Optional[np.ndarray]:
+        """Read the chunk at `key` from `source`, if it is there."""
+        if self.source is None or key not in self.source.keys:
+            return None
+        return self._store(key, self.source.load(key))
+
+    def hydrate_all(self) -> None:
+        """Read every chunk left in `source`, so `chunks` holds the whole map."""
+        if self.source is None:
+            return
+        for key in list(self.source.keys):
+            self._hydrate(key)
+        self.source = None
+
+    def _new_chunk(self, cx: int, cy: int) -> np.ndarray:
+        size = self.chunk_size
+        if self.generator is None:
+            return np.full((size, size), fill_value=self.fill_value, order="F")
+        chunk = np.asarray(self.generator(cx * size, cy * size, size, size), dtype=self.dtype)
+        assert chunk.shape == (size, size), f"Generator returned a {chunk.shape} block."
+        return np.asfortranarray(chunk)
+
+    def ensure_region(
+        self, x0: int, y0: int, x1: int, y1: int, progress: Optional[Callable[[float], None]] = None
+    ) -> int:
+        """
+        Make sure every chunk overlapping [x0:x1, y0:y1] exists. Returns how many were created.
+        `progress` is called with the fraction of the chunks done after each one.
+        """
+        keys = list(self.chunk_keys_in(x0, y0, x1, y1))
+        created = 0
+        for done, key in enumerate(keys, start=1):
+            if key not in self.chunks:
+                self.chunk(*key)
+                created += 1
+            if progress is not None:
+                progress(done / len(keys))
+        return created
+
+    def chunk_keys_in(self, x0: int, y0: int, x1: int, y1: int) -> Iterator[ChunkKey]:
+        """Iterate over the keys of the in-bounds chunks overlapping [x0:x1, y0:y1]."""
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.width), min(y1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        size = self.chunk_size
+        for cx in range(x0 // size, (x1 - 1) // size + 1):
+            for cy in range(y0 // size, (y1 - 1) // size + 1):
+                yield cx, cy
+
+    def items(self) -> Iterator[Tuple[ChunkKey, np.ndarray]]:
+        """Iterate over the chunks allocated so far."""
+        self.hydrate_all()
+        yield from self.chunks.items()
+
+    def read(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """
+        Return a dense copy of the region [x0:x1, y0:y1].
+        Cells outside of the map are filled with `fill_value`.
+        """
+        out = np.full((max(x1 - x0, 0), max(y1 - y0, 0)), fill_value=self.fill_value, order="F")
+        size = self.chunk_size
+        for cx, cy in self.chunk_keys_in(x0, y0, x1, y1):
+            chunk = self.chunk(cx, cy)
+            # Overlap between the requested region and this chunk, in map coordinates.
+            left, top = max(x0, cx * size), max(y0, cy * size)
+            right = min(x1, (cx + 1) * size, self.width)
+            bottom = min(y1, (cy + 1) * size, self.height)
+            out[left - x0:right - x0, top - y0:bottom - y0] = chunk[
+                left - cx * size:right - cx * size, top - cy * size:bottom - cy * size
+            ]
+        return out
+
+    def write(self, x0: int, y0: int, block) -> None:
+        """Write a dense block with its top-left corner at (x0, y0). Out of bounds cells are ignored."""
+        block = np.asarray(block)
+        if block.ndim < 2:
+            # Scalar or record broadcasted over the whole region isn't supported here.
+            raise ValueError("write() needs a 2D block.")
+        x1, y1 = x0 + block.shape[0], y0 + block.shape[1]
+        size = self.chunk_size
+        for cx, cy in self.chunk_keys_in(x0, y0, x1, y1):
+            chunk = self.chunk(cx, cy)
+            left, top = max(x0, cx * size), max(y0, cy * size)
+            right = min(x1, (cx + 1) * size, self.width)
+            bottom = min(y1, (cy + 1) * size, self.height)
+            chunk[left - cx * size:right - cx * size, top - cy * size:bottom - cy * size] = block[
+                left - x0:right - x0, top - y0:bottom - y0
+            ]
+            self.dirty.add((cx, cy))
+
+    def _region(self, key) -> Union[Tuple[int, int], Tuple[int, int, int, int]]:
+        return index_region(key, self.shape)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return ChunkedField(self, key)
+        region = self._region(key)
+        if len(region) == 2:
+            x, y = region
+            size = self.chunk_size
+            return self.chunk(x // size, y // size)[x % size, y % size]
+        return drop_point_axes(self.read(*region), key)
+
+    def __setitem__(self, key, value) -> None:
+        region = self._region(key)
+        if len(region) == 2:
+            x, y = region
+            size = self.chunk_size
+            self.chunk(x // size, y // size)[x % size, y % size] = value
+            self.dirty.add((x // size, y // size))
+            return
+        x0, y0, x1, y1 = region
+        block = np.empty((x1 - x0, y1 - y0), dtype=self.dtype, order="F")
+        block[...] = value
+        self.write(x0, y0, block)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        """Materialize the whole map. This generates every chunk, so avoid it on big worlds."""
+        array = self.read(0, 0, self.width, self.height)
+        return array if dtype is None else array.astype(dtype)
+
+
+class ChunkedField:
+    """
+    A view of a single named field of a structured ChunkedTiles, such as `tiles["walkable"]`.
+    With a palette the field is looked up per tile id and is read only.
+    """
+
+    def __init__(self, store: ChunkedTiles, field: str):
+        self.store = store
+        self.field = field
+        self.values = None if store.palette is None else store.palette[field]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.store.shape
+
+    def read(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        if self.values is not None:
+            return self.values[self.store.read(x0, y0, x1, y1)]
+        return self.store.read(x0, y0, x1, y1)[self.field]
+
+    def __getitem__(self, key):
+        if self.values is not None:
+            return self.values[self.store[key]]
+        return self.store[key][self.field]
+
+    def __setitem__(self, key, value) -> None:
+        if self.values is not None:
+            raise TypeError(f"Can't set {self.field!r} per cell on a palette map, set the tile id instead.")
+        region = self.store._region(key)
+        if len(region) == 2:
+            x, y = region
+            size = self.store.chunk_size
+            self.store.chunk(x // size, y // size)[self.field][x % size, y % size] = value
+            self.store.dirty.add((x // size, y // size))
+            return
+        x0, y0, x1, y1 = region
+        block = self.store.read(x0, y0, x1, y1)
+        block[self.field] = value
+        self.store.write(x0, y0, block)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        array = self.read(0, 0, self.store.width, self.store.height)
+        return array if dtype is None else array.astype(dtype)
+
+
+class ChunkedBitset(ChunkedTiles):
+    """
+    A boolean map kept as bit-packed chunks (one bit per cell).
+
+    Only chunks with at least one True cell are stored, so memory and save size
+    grow with the area that was actually marked, like the explored part of the world.
+    """
+
+    def __init__(
+        self, width: int, height: int, chunk_size: int = config.CHUNK_SIZE, memmap_path: Optional[str] = None
+    ):
+        super().__init__(width, height, fill_value=False, chunk_size=chunk_size, memmap_path=memmap_path)
+
+    @property
+    def slot_shape(self) -> Tuple[int, ...]:
+        return (self.chunk_size * self.chunk_size // 8,)
+
+    @property
+    def slot_dtype(self) -> np.dtype:
+        return np.dtype(np.uint8)  # Packed bits.
+
+    def chunk(self, cx: int, cy: int) -> np.ndarray:
+        """Return an unpacked copy of a chunk. Changes to it are only kept through `write`."""
+        size = self.chunk_size
+        bits = self.chunks.get((cx, cy))
+        if bits is None:
+            bits = self._hydrate((cx, cy))
+        if bits is None:
+            return np.zeros((size, size), dtype=bool, order="F")
+        return np.unpackbits(bits, count=size * size).view(bool).reshape((size, size), order="F")
+
+    def write(self, x0: int, y0: int, block) -> None:
+        block = np.asarray(block, dtype=bool)
+        x1, y1 = x0 + block.shape[0], y0 + block.shape[1]
+        size = self.chunk_size
+        for cx, cy in self.chunk_keys_in(x0, y0, x1, y1):
+            left, top = max(x0, cx * size), max(y0, cy * size)
+            right = min(x1, (cx + 1) * size, self.width)
+            bottom = min(y1, (cy + 1) * size, self.height)
+            part = block[left - x0:right - x0, top - y0:bottom - y0]
+            if (cx, cy) not in self.chunks and self._hydrate((cx, cy)) is None and not part.any():
+                continue  # Writing False over an empty chunk changes nothing.
+            chunk = self.chunk(cx, cy)
+            chunk[left - cx * size:right - cx * size, top - cy * size:bottom - cy * size] = part
+            if chunk.any():
+                self._store((cx, cy), np.packbits(chunk.ravel(order="F")))
+            else:
+                del self.chunks[cx, cy]
+            self.dirty.add((cx, cy))
+
+    def __setitem__(self, key, value) -> None:
+        region = self._region(key)
+        if len(region) == 2:
+            x, y = region
+            region = x, y, x + 1, y + 1
+        x0, y0, x1, y1 = region
+        block = np.empty((x1 - x0, y1 - y0), dtype=bool, order="F")
+        block[...] = value
+        self.write(x0, y0, block)
+
+
+class VisibleWindow:
+    """
+    The cells the player can currently see.
+
+    Only the window of the last FOV computation is stored; everything outside of it
+    is not visible. Reads work like a dense boolean map: `visible[x, y]`, `visible[x0:x1, y0:y1]`.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width, self.height = width, height
+        self.left = self.top = 0
+        self.cells = np.zeros((0, 0), dtype=bool, order="F")
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def window(self) -> Tuple[int, int, int, int]:
+        """The stored region as (left, top, right, bottom)."""
+        return self.left, self.top, self.left + self.cells.shape[0], self.top + self.cells.shape[1]
+
+    def set_window(self, left: int, top: int, cells: np.ndarray) -> None:
+        """Replace what is visible with `cells`, whose top-left corner is at (left, top)."""
+        self.left, self.top = left, top
+        self.cells = np.asarray(cells, dtype=bool)
+
+    def clear(self) -> None:
+        self.set_window(0, 0, np.zeros((0, 0), dtype=bool))
+
+    def read(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        out = np.zeros((max(x1 - x0, 0), max(y1 - y0, 0)), dtype=bool, order="F")
+        left, top, right, bottom = self.window
+        left, top = max(left, x0), max(top, y0)
+        right, bottom = min(right, x1), min(bottom, y1)
+        if left < right and top < bottom:
+            out[left - x0:right - x0, top - y0:bottom - y0] = self.cells[
+                left - self.left:right - self.left, top - self.top:bottom - self.top
+            ]
+        return out
+
+    def __getitem__(self, key):
+        region = index_region(key, self.shape)
+        if len(region) == 2:
+            x, y = region
+            left, top, right, bottom = self.window
+            return bool(left <= x < right and top <= y < bottom and self.cells[x - left, y - top])
+        return drop_point_axes(self.read(*region), key)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Report how much memory each kind of entity takes once spawned, to catch regressions
+in the entity and component layout. Run it with `python memory_report.py`.
+"""
+import sys
+import tracemalloc
+
+import entity  # Imported before setup_game to avoid a circular import.
+import setup_game
+from message_log import Message
+
+SAMPLES = 1000
+
+
+def measure(make) -> float:
+    """Bytes allocated per call of `make`, averaged over SAMPLES calls."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    made = [make(i) for i in range(SAMPLES)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del made
+    return (after - before) / SAMPLES
+
+
+def report() -> None:
+    engine = setup_game.new_game()
+    factories = engine.entity_factories
+    game_map = engine.game_map
+    x0, y0 = engine.player.x + 10, engine.player.y + 10
+
+    print(f"\n - Memory per entity ({SAMPLES} samples, including the map's entity index):")
+    templates = [
+        ("Actor", factories.monsters[0]),
+        ("Item", factories.items[0]),
+        ("Chest", factories.container),
+    ]
+    for name, template in templates:
+        per_entity = measure(lambda i: template.spawn(game_map, x0 + i % 100, y0 + i // 100))
+        print(f"   - {name} ({template.name}): {per_entity:,.0f} bytes, entity object {sys.getsizeof(template)} bytes")
+
+    per_message = measure(lambda i: Message(f"Message {i}", (255, 255, 255)))
+    print(f"   - Message: {per_message:,.0f} bytes (with its text)")
+
+
+if __name__ == "__main__":
+    report()
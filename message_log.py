@@ -1,12 +1,15 @@
-from typing import Iterable, List, Reversible, Tuple
+from typing import Iterable, List, Optional, Protocol, Reversible, Tuple
 import textwrap
 
 import tcod
 
 import categories.color as color
+from slotted import Slotted
 
 
-class Message:
+class Message(Slotted):
+    __slots__ = ("plain_text", "fg", "count")
+
     def __init__(self, text: str, fg: Tuple[int, int, int]):
         self.plain_text = text
         self.fg = fg
@@ -20,9 +23,48 @@ class Message:
         return self.plain_text
 
 
+class HistorySource(Protocol):
+    """Older messages stored elsewhere (like a save file), only read when the history is scrolled back to them."""
+
+    def load_before(self, index: int) -> List[Message]:
+        """Read the messages that end just before message `index` (at least one, if `index` > 0)."""
+
+
 class MessageLog:
+    """
+    The messages shown to the player.
+
+    A loaded game only reads the last messages: `messages` then starts at message
+    `first_index`, and the older ones are read from `source` by `load_from` when needed.
+    """
+
+    # Defaults for saves made before the log could be partly loaded.
+    first_index: int = 0
+    source: Optional[HistorySource] = None
+
     def __init__(self) -> None:
         self.messages: List[Message] = []
+        self.first_index = 0
+        self.source = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["source"] = None  # Belongs to the file this log was loaded from.
+        return state
+
+    @property
+    def length(self) -> int:
+        """Number of messages, including the ones not read yet."""
+        return self.first_index + len(self.messages)
+
+    def load_from(self, index: int) -> None:
+        """Make sure the messages from `index` on are in `messages`, reading older ones from `source`."""
+        while self.first_index > max(index, 0):
+            older = self.source.load_before(self.first_index)
+            self.messages[:0] = older
+            self.first_index -= len(older)
+        if self.first_index == 0:
+            self.source = None
 
     def add_message(
         self, text: str, fg: Tuple[int, int, int] = color.white, *, stack: bool = True,
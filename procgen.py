@@ -1,49 +1,73 @@
 from __future__ import annotations
 
-import random
-from categories.biomes import biomes
+import os
+from categories.biomes import compile_biomes
 import config
-from typing import Dict, Tuple, TYPE_CHECKING
+from typing import Callable, Dict, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np
-from PIL import Image
-import threading
-import time
-import tcod
 
-import categories.tile_types as tile_types
+import world_noise
+from world_cache import LayerCache, prune
 
 if TYPE_CHECKING:
     from engine import Engine
 
-def generate_perlin_grid(width: int, height: int, scale: float) -> np.ndarray:
-    """Generate a 2D Perlin noise grid."""
-    from perlin_noise import perlin_noise
-    seed=random.randint(1, 9999999)
-    perlin = perlin_noise.PerlinNoise(octaves=8, seed=seed)
-    grid = np.zeros((width, height))
-    for y in range(height):
-        for x in range(width):
-            grid[x, y] = perlin((x/scale, y/scale))
-
-    # Avoid division by zero during normalization
-    grid_min, grid_max = np.min(grid), np.max(grid)
-    if grid_max != grid_min:
-        grid = (grid - grid_min) / (grid_max - grid_min)  # Normalize to [0, 1]
-    else:
-        grid = np.zeros_like(grid)  # If all values are the same, return a grid of zeros
-
-    return grid
-
-
-def determine_biome(elevation: float, humidity: float, temperature: float):
-    """Determine the biome based on elevation, humidity, and temperature."""
-    for biome in biomes:
-        if biome.matches(elevation, humidity, temperature):
-            return biome.tile_type
-    # Default to grass if no biome matches
-    print (f"Error made with height:{elevation.__format__("0.00")} temp:{temperature.__format__("0.00")} humid:{humidity.__format__("0.00")}")
-    return tile_types.floor_error
+ProgressCallback = Callable[[float, str], None]
+"""Receives the fraction done (0 to 1) and what is being done. It may raise to stop generation."""
+
+# Tiles around the spawn point generated before the first frame, besides one chunk.
+SPAWN_AREA_MARGIN = 16
+
+# Biome ranges compiled once, gaps and overlaps are reported here instead of per tile.
+BIOME_TABLE = compile_biomes()
+# Identifies the noise algorithm in the cache keys, see world_noise.digest.
+NOISE_DIGEST = world_noise.digest()
+
+
+class OverworldGenerator:
+    """
+    Builds overworld tiles one block at a time, so chunks can be made only when needed.
+
+    The result only depends on the seed, so with `cache_dir` every block is kept on disk
+    and later games with the same seed and world size load it instead of generating it.
+    The cache is keyed by the noise algorithm too, so changing `world_noise` starts a new one.
+    The noise is cached apart from the tiles, which are also keyed by the biome table:
+    editing biomes reclassifies the cached noise instead of computing it again.
+    Only the caches of the config.WORLD_CACHE_LIMIT most recently used worlds are kept.
+    """
+
+    def __init__(
+        self, seed: int, scale: float = 500.0, world_size: Tuple[int, int] = (0, 0), cache_dir: Optional[str] = None
+    ):
+        self.seed = seed
+        self.scale = scale
+        self.cache: Optional[LayerCache] = None
+        self.tile_layer = f"tiles_{BIOME_TABLE.digest()}"
+        if cache_dir is not None:
+            width, height = world_size
+            self.cache = LayerCache(os.path.join(cache_dir, f"{seed}_{width}x{height}_{scale:g}_{NOISE_DIGEST}"))
+            self.cache.touch()
+            prune(cache_dir, config.WORLD_CACHE_LIMIT)
+
+    def noise(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """Height, humidity and temperature of the block, as a (3, width, height) array."""
+        noise = None if self.cache is None else self.cache.load("noise", x, y, width, height)
+        if noise is None:
+            # Height, humidity and temperature come out of a single noise pass.
+            noise = world_noise.fbm(self.seed, x, y, width, height, self.scale)
+            if self.cache is not None:
+                self.cache.save("noise", x, y, width, height, noise)
+        return noise
+
+    def __call__(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        tiles = None if self.cache is None else self.cache.load(self.tile_layer, x, y, width, height)
+        if tiles is None:
+            heightmap, humidity_map, temperature_map = self.noise(x, y, width, height)
+            tiles = BIOME_TABLE.classify(heightmap, humidity_map, temperature_map)
+            if self.cache is not None:
+                self.cache.save(self.tile_layer, x, y, width, height, tiles)
+        return tiles
 
 
 def generate_overworld(
@@ -51,35 +75,30 @@ def generate_overworld(
     map_height: int,
     engine: Engine,
     seed: int,
-    noise_scale: float = 100.0,
+    progress: Optional[ProgressCallback] = None,
+    layers_root: Optional[str] = None,
 ) -> "GameMap":  # type: ignore
     from game_map import GameMap  # Importação atrasada para evitar dependência circular
 
     player = engine.player
-    overworld = GameMap(engine, map_width, map_height, entities=[player])
-
-    # Gerar mapas de Perlin noise
-    heightmap = generate_perlin_grid(config.WORLD_SIZE_X, config.WORLD_SIZE_Y, 500.0)
-    humidity_map = generate_perlin_grid(config.WORLD_SIZE_X, config.WORLD_SIZE_Y, 500.0)
-    temperature_map = generate_perlin_grid(config.WORLD_SIZE_X, config.WORLD_SIZE_Y, 500.0)
-
-    def draw_loading_screen(console: tcod.console.Console, progress: int) -> None:
-        """Desenha a tela de carregamento com uma barra de progresso."""
-        console.clear()
-        console.print(x=1, y=1, string="Generating Overworld...", fg=(255, 255, 255))
-        bar_width = int((progress / 100) * (console.width - 2))
-        console.draw_rect(x=1, y=3, width=console.width - 2, height=1, ch=ord(" "), bg=(100, 100, 100))
-        console.draw_rect(x=1, y=3, width=bar_width, height=1, ch=ord(" "), bg=(0, 200, 50))
-        console.print(x=console.width // 2 - 5, y=5, string=f"{progress}%", fg=(255, 255, 255))
-
-    for x in range(map_width):
-        for y in range(map_height):
-            biome = determine_biome(heightmap[x, y], humidity_map[x, y], temperature_map[x, y])
-            overworld.tiles[x, y] = biome
-            draw_loading_screen(tcod.console.Console, (x * map_height + y) / (map_width * map_height) * 100)
+    # Tiles are generated chunk by chunk the first time something reads them.
+    generator = OverworldGenerator(
+        seed=seed, scale=500.0, world_size=(map_width, map_height), cache_dir=config.WORLD_CACHE_DIR
+    )
+    overworld = GameMap(
+        engine, map_width, map_height, entities=[player], tile_generator=generator, layers_root=layers_root
+    )
 
     # Colocar o jogador no centro do mapa
     player_x, player_y = map_width // 2, map_height // 2
     player.place(player_x, player_y, overworld)
 
+    # Generate the chunks around the player up front, the rest is made while exploring.
+    radius = overworld.tiles.chunk_size + SPAWN_AREA_MARGIN
+    created = overworld.tiles.ensure_region(
+        player_x - radius, player_y - radius, player_x + radius, player_y + radius,
+        progress=None if progress is None else lambda fraction: progress(fraction, "Generating terrain..."),
+    )
+    print (f" - Generated {created} chunks around the player...")
+
     return overworld
\ No newline at end of file
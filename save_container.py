@@ -0,0 +1,397 @@
+"""Save files made of independent records, so a save only rewrites what changed.
+
+A save is a single SQLite file holding:
+- `chunks`: one row per map chunk and layer ("tiles", "explored").
+- `records`: the pickled Engine object graph (without the chunks and the log),
+  and the message log split in blocks of LOG_BLOCK_SIZE messages.
+
+The Engine pickle refers to the chunk stores and the log through persistent ids,
+so they are written as their own rows and put back in place when loading.
+Each save is a single SQLite transaction, so an interrupted save leaves the previous one intact.
+
+A `format` record holds FORMAT_VERSION. Saves from before this container, a single
+lzma-compressed pickle, are loaded, brought up to date (see `slotted.Slotted`) and saved
+again as a container; the old file is kept with LEGACY_BACKUP_SUFFIX.
+
+Loading only reads the Engine record and the last log block. Map chunks and older log blocks
+stay in the file until the game first touches them (see `SavedChunks` and `SavedLog`),
+so Continue doesn't wait for the whole map or the whole history.
+"""
+from __future__ import annotations
+
+import io
+import lzma
+import os
+import pickle
+import sqlite3
+import threading
+import traceback
+import zlib
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+from exceptions import IncompatibleSave
+import slotted
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from map_chunks import ChunkedTiles, ChunkKey
+
+# Bumped when a save can no longer be read by older code. Saves without a `format` record are version 1.
+FORMAT_VERSION = 1
+
+# Every SQLite database starts with this. The older single-pickle saves start with the lzma magic instead.
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Appended to the name of a single-pickle save when it is converted to a container.
+LEGACY_BACKUP_SUFFIX = ".legacy"
+
+# Messages per log record. Only the blocks after the last saved message are rewritten.
+LOG_BLOCK_SIZE = 256
+
+
+class SaveContainer:
+    """A single save file of named records and map chunks, backed by SQLite."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS records (name TEXT PRIMARY KEY, data BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS chunks (
+                layer TEXT NOT NULL, cx INTEGER NOT NULL, cy INTEGER NOT NULL, data BLOB NOT NULL,
+                PRIMARY KEY (layer, cx, cy)
+            );
+            """
+        )
+
+    def __enter__(self) -> SaveContainer:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # Everything written inside the block is committed at once, or not at all.
+        if exc_type is None:
+            self.connection.commit()
+        else:
+            self.connection.rollback()
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def clear(self) -> None:
+        self.connection.execute("DELETE FROM records")
+        self.connection.execute("DELETE FROM chunks")
+
+    def write_record(self, name: str, data: bytes) -> None:
+        self.connection.execute("REPLACE INTO records (name, data) VALUES (?, ?)", (name, data))
+
+    def read_record(self, name: str) -> Optional[bytes]:
+        row = self.connection.execute("SELECT data FROM records WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def write_chunk(self, layer: str, key: ChunkKey, array: np.ndarray) -> None:
+        self.connection.execute(
+            "REPLACE INTO chunks (layer, cx, cy, data) VALUES (?, ?, ?, ?)", (layer, *key, pack_array(array))
+        )
+
+    def delete_chunk(self, layer: str, key: ChunkKey) -> None:
+        self.connection.execute("DELETE FROM chunks WHERE layer = ? AND cx = ? AND cy = ?", (layer, *key))
+
+    def read_chunk(self, layer: str, key: ChunkKey) -> Optional[np.ndarray]:
+        row = self.connection.execute(
+            "SELECT data FROM chunks WHERE layer = ? AND cx = ? AND cy = ?", (layer, *key)
+        ).fetchone()
+        return None if row is None else unpack_array(row[0])
+
+    def chunk_keys(self, layer: str) -> Set[ChunkKey]:
+        return {(cx, cy) for cx, cy in self.connection.execute("SELECT cx, cy FROM chunks WHERE layer = ?", (layer,))}
+
+
+
+class SavedChunks:
+    """The chunks of a layer still in a save file, read one by one as the map needs them."""
+
+    def __init__(self, filename: str, layer: str, keys: Set[ChunkKey]):
+        self.filename = filename
+        self.layer = layer
+        self.keys = keys
+        self.container: Optional[SaveContainer] = None
+
+    def load(self, key: ChunkKey) -> np.ndarray:
+        self.keys.remove(key)
+        if self.container is None:
+            self.container = SaveContainer(self.filename)
+        chunk = self.container.read_chunk(self.layer, key)
+        if chunk is None:
+            raise pickle.UnpicklingError(f"Chunk {key} of {self.layer!r} is missing from {self.filename}.")
+        if not self.keys:
+            self.container.close()
+            self.container = None
+        return chunk
+
+
+class SavedLog:
+    """The message log blocks still in a save file, read one by one as the history is scrolled back."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    def load_before(self, index: int) -> List:
+        block = index // LOG_BLOCK_SIZE - 1  # Only whole blocks are read, so `index` is at a block start.
+        with SaveContainer(self.filename) as container:
+            data = container.read_record(f"log/{block}")
+        if data is None:
+            raise pickle.UnpicklingError(f"Log block {block} is missing from {self.filename}.")
+        return _unpack_log_block(data)
+
+
+def pack_array(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    # zlib instead of lzma here: chunks are small and many, and lzma's setup cost dominates.
+    return zlib.compress(buffer.getvalue())
+
+
+def unpack_array(data: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(zlib.decompress(data)), allow_pickle=False)
+
+
+class _EnginePickler(pickle.Pickler):
+    """Pickles the Engine but leaves out the objects listed in `external`, which are saved as their own records."""
+
+    def __init__(self, file, external: Dict[int, tuple]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.external = external
+
+    def persistent_id(self, obj):
+        return self.external.get(id(obj))
+
+
+class _EngineUnpickler(pickle.Unpickler):
+    def __init__(self, file, container: SaveContainer):
+        super().__init__(file)
+        self.container = container
+        self.log_first_index = 0  # Index of the first message read, see _read_log_tail.
+
+    def persistent_load(self, pid):
+        kind = pid[0]
+        if kind == "chunks":
+            return {}  # Filled on demand, see load_engine.
+        if kind == "log":
+            self.log_first_index, messages = _read_log_tail(self.container)
+            return messages
+        raise pickle.UnpicklingError(f"Unknown record {pid!r} in save file.")
+
+
+def chunk_layers(engine: Engine) -> Dict[str, ChunkedTiles]:
+    """The chunked stores of the current map, by layer name."""
+    if not hasattr(engine, "game_map"):
+        return {}
+    return {"tiles": engine.game_map.tiles, "explored": engine.game_map.explored}
+
+
+def _unpack_log_block(data: bytes) -> List:
+    with lzma.open(io.BytesIO(data)) as f:
+        return pickle.load(f)
+
+
+def _read_log_tail(container: SaveContainer) -> Tuple[int, List]:
+    """Read the last log block. Returns the index of its first message and the messages in it."""
+    length = int(container.read_record("log_length") or 0)
+    block = max(length - 1, 0) // LOG_BLOCK_SIZE
+    data = container.read_record(f"log/{block}")
+    return block * LOG_BLOCK_SIZE, [] if data is None else _unpack_log_block(data)
+
+
+class SaveSnapshot:
+    """
+    Everything a save writes, copied out of the game so it can be written while the game goes on.
+
+    Taking the snapshot pickles the Engine and copies the changed chunks, which is cheap;
+    compressing and writing, the slow part, happens in `write` and may run in another thread.
+    """
+
+    def __init__(self, engine: Engine, filename: str):
+        self.engine = engine
+        self.path = os.path.abspath(filename)
+        self.full = engine.saved_to != self.path or not os.path.exists(self.path)
+        layers = chunk_layers(engine)
+        log = engine.message_log
+        if self.full:
+            # Chunks and messages not read from the file the game was loaded from are written too.
+            for store in layers.values():
+                store.hydrate_all()
+            log.load_from(0)
+        messages = log.messages
+
+        # (layer, key, copy of the chunk or None if it was deleted)
+        self.chunks: List[Tuple[str, ChunkKey, Optional[np.ndarray]]] = []
+        for layer, store in layers.items():
+            for key in (store.chunks.keys() if self.full else store.dirty):
+                chunk = store.chunks.get(key)
+                self.chunks.append((layer, key, None if chunk is None else np.array(chunk)))
+            store.dirty.clear()
+
+        # The last saved message may have been stacked since, so its block is written again.
+        # Blocks before it are in the file already, which is also where the ones not read yet are.
+        saved_length = 0 if self.full else engine.saved_log_length
+        first_block = max(saved_length - 1, 0) // LOG_BLOCK_SIZE
+        offset = log.first_index
+        self.log_blocks = [
+            (start // LOG_BLOCK_SIZE, pickle.dumps(messages[start - offset:start - offset + LOG_BLOCK_SIZE]))
+            for start in range(first_block * LOG_BLOCK_SIZE, log.length, LOG_BLOCK_SIZE)
+        ]
+        self.log_length = log.length
+
+        external: Dict[int, tuple] = {id(store.chunks): ("chunks", layer) for layer, store in layers.items()}
+        external[id(messages)] = ("log",)
+        buffer = io.BytesIO()
+        _EnginePickler(buffer, external).dump(engine)
+        self.engine_data = buffer.getvalue()
+
+        engine.saved_to = self.path
+        engine.saved_log_length = self.log_length
+
+    def write(self) -> None:
+        """Compress and write the snapshot. The file only changes if the whole transaction succeeds."""
+        try:
+            if self.full and os.path.exists(self.path) and not is_container(self.path):
+                os.remove(self.path)  # An older save SQLite can't open, replaced by this one.
+            with SaveContainer(self.path) as container:
+                if self.full:
+                    container.clear()
+                for layer, key, chunk in self.chunks:
+                    if chunk is None:
+                        container.delete_chunk(layer, key)
+                    else:
+                        container.write_chunk(layer, key, chunk)
+                for block, data in self.log_blocks:
+                    container.write_record(f"log/{block}", lzma.compress(data))
+                container.write_record("format", str(FORMAT_VERSION).encode())
+                container.write_record("log_length", str(self.log_length).encode())
+                container.write_record("engine", lzma.compress(self.engine_data))
+        except BaseException:
+            # The changes in this snapshot are no longer marked dirty, so the next save has to be full.
+            self.engine.saved_to = None
+            raise
+
+
+def save_engine(engine: Engine, filename: str) -> None:
+    """
+    Save `engine` to `filename`.
+
+    If the file is the one this game was last saved to or loaded from, only the chunks
+    changed since then and the new messages are written, plus the Engine record.
+    """
+    background_saver.wait()  # Don't write the same file from two threads.
+    SaveSnapshot(engine, filename).write()
+
+
+class BackgroundSaver:
+    """Writes save snapshots in a worker thread, one at a time."""
+
+    def __init__(self):
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def save(self, engine: Engine, filename: str) -> bool:
+        """
+        Snapshot `engine` now and write it in the background.
+        Returns False, without saving, if the previous save is still being written.
+        """
+        if self.busy:
+            return False
+        snapshot = SaveSnapshot(engine, filename)
+        # Not a daemon, so quitting waits for the save to be written.
+        self.thread = threading.Thread(target=self._write, args=(snapshot,), name="autosave")
+        self.thread.start()
+        return True
+
+    def _write(self, snapshot: SaveSnapshot) -> None:
+        try:
+            snapshot.write()
+        except Exception:
+            traceback.print_exc()  # Print to stderr.
+
+    def wait(self) -> None:
+        """Block until the save being written, if any, is done."""
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+background_saver = BackgroundSaver()
+
+
+def is_container(path: str) -> bool:
+    """Whether the existing file at `path` is a save container, and not an older single-pickle save."""
+    with open(path, "rb") as f:
+        return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+def check_format(path: str, container: SaveContainer) -> None:
+    """Raise IncompatibleSave if the save at `path` can't be read by this version."""
+    version = container.read_record("format")
+    version = 1 if version is None else int(version)
+    if version > FORMAT_VERSION:
+        raise IncompatibleSave(f"{os.path.basename(path)} was saved by a newer version of the game (format {version}).")
+
+
+def _convert_legacy(path: str) -> Engine:
+    """Load a single-pickle save, then save it again at `path` as a container."""
+    try:
+        with lzma.open(path) as f:
+            engine = pickle.load(f)
+        slotted.finish_upgrades()
+    except Exception as exc:
+        slotted.discard_upgrades()
+        raise IncompatibleSave(
+            f"{os.path.basename(path)} was saved by an older version of the game and can't be converted ({exc})."
+        ) from exc
+    # Kept in case the conversion loses something, the game only uses the new file from now on.
+    os.replace(path, path + LEGACY_BACKUP_SUFFIX)
+    save_engine(engine, path)
+    engine.update_fov()  # Older saves kept a whole visibility map, which isn't carried over.
+    return engine
+
+
+def load_engine(filename: str) -> Engine:
+    """Load an Engine saved with `save_engine`."""
+    background_saver.wait()
+    path = os.path.abspath(filename)
+    if not os.path.exists(path):
+        raise FileNotFoundError(filename)
+    if not is_container(path):
+        return _convert_legacy(path)
+    with SaveContainer(path) as container:
+        check_format(path, container)
+        data = container.read_record("engine")
+        if data is None:
+            raise pickle.UnpicklingError(f"{filename} has no game in it.")
+        # Decompressed as it is unpickled, so the whole decompressed record is never in memory at once.
+        with lzma.open(io.BytesIO(data)) as f:
+            unpickler = _EngineUnpickler(f, container)
+            try:
+                engine = unpickler.load()
+            except BaseException:
+                slotted.discard_upgrades()
+                raise
+        # Saves made before some of the state was kept are brought up to date now the whole graph is loaded.
+        slotted.finish_upgrades()
+        sources = {layer: SavedChunks(path, layer, container.chunk_keys(layer)) for layer in chunk_layers(engine)}
+
+    for layer, store in chunk_layers(engine).items():
+        store.source = sources[layer]
+        store.dirty.clear()
+    log = engine.message_log
+    log.first_index = unpickler.log_first_index
+    log.source = SavedLog(path) if log.first_index else None
+    engine.saved_to = path
+    engine.saved_log_length = log.length
+    return engine
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import heapq
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from entity import Actor
+
+
+class TurnScheduler:
+    """
+    The turns of the actors of a GameMap, ordered by game time in a heap.
+
+    Every actor is filed under the time of its next action and waits `Fighter.action_time`
+    after acting, so fast actors come up more often and slow ones less. Only the actors that
+    are due are popped; the ones sleeping or far in the future cost nothing until then.
+
+    Entries are not removed from the heap when an actor is rescheduled or dropped,
+    they are skipped when popped instead (see `due`).
+    """
+
+    def __init__(self):
+        self.time = 0
+        self.queue: List[Tuple[int, int, Actor]] = []
+        # Sequence number of each actor's live entry. The sequence also keeps the heap
+        # from ever comparing two actors when their times are equal.
+        self.due: Dict[Actor, int] = {}
+        self.sequence = 0
+
+    def __len__(self) -> int:
+        return len(self.due)
+
+    def __contains__(self, actor: Actor) -> bool:
+        return actor in self.due
+
+    def schedule(self, actor: Actor, time: int) -> None:
+        """File `actor` to act at `time`, replacing its previous entry."""
+        self.sequence += 1
+        self.due[actor] = self.sequence
+        heapq.heappush(self.queue, (time, self.sequence, actor))
+
+    def unschedule(self, actor: Actor) -> None:
+        self.due.pop(actor, None)
+
+    def pop(self, until: int) -> Optional[Actor]:
+        """
+        Remove and return the next actor due at or before `until`, advancing `time` to its turn.
+        Returns None if no one is due by then.
+        """
+        queue = self.queue
+        while queue and queue[0][0] <= until:
+            time, sequence, actor = heapq.heappop(queue)
+            if self.due.get(actor) == sequence:
+                del self.due[actor]
+                self.time = time
+                return actor
+        return None
+
+    def clear(self) -> None:
+        self.queue.clear()
+        self.due.clear()
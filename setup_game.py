@@ -2,27 +2,39 @@
 from __future__ import annotations
 from tcod import libtcodpy
 
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
-import copy
 import tcod
-import lzma
-import pickle
+import threading
+import time
 import traceback
 
 import config
 import categories.color as color
+import exceptions
 from engine import Engine
 from entity_factories import EntityFactories
 from game_map import GameWorld
 import input_handlers
+import save_container
+
+if TYPE_CHECKING:
+    from procgen import ProgressCallback
+
+# Minimum seconds between two progress updates shown by the loading screen.
+PROGRESS_INTERVAL = 0.05
 
 # Load the background image and remove the alpha channel.
 background_image = tcod.image.load("images/menu_background.png")[:, :, :3]
 
 
-def new_game() -> Engine:
-    """Return a brand new game session as an Engine instance."""
+def new_game(progress: Optional[ProgressCallback] = None) -> Engine:
+    """
+    Return a brand new game session as an Engine instance.
+    `progress` is called as the world is built, see `procgen.ProgressCallback`.
+    """
+    if progress is not None:
+        progress(0.0, "Loading entities...")
     map_width = config.WORLD_SIZE_X
     map_height = config.WORLD_SIZE_Y
 
@@ -36,7 +48,7 @@ def new_game() -> Engine:
     engine = Engine(player=None, entity_factories=EntityFactories(None, None))
     entity_factories = EntityFactories(engine=engine, gamemap=None)
     engine.entity_factories = entity_factories
-    player = copy.deepcopy(entity_factories.player)
+    player = entity_factories.player.instantiate()
     engine.player = player
 
     engine.game_world = GameWorld(
@@ -48,8 +60,9 @@ def new_game() -> Engine:
         map_height=map_height,
         max_monsters_per_room=max_monsters_per_room,
         max_items_per_room=max_items_per_room,
+        seed=config.WORLD_SEED,
     )
-    engine.game_world.generate_floor()
+    engine.game_world.generate_floor(progress=progress)
     engine.entity_factories.gamemap = engine.game_map
     engine.game_map.engine = engine
     engine.update_fov()
@@ -61,8 +74,7 @@ def new_game() -> Engine:
 
 def load_game(filename: str) -> Engine:
     """Load an Engine instance from a file."""
-    with open(filename, "rb") as f:
-        engine = pickle.loads(lzma.decompress(f.read()))
+    engine = save_container.load_engine(filename)
     assert isinstance(engine, Engine)
     return engine
 
@@ -136,13 +148,88 @@ class MainMenu(input_handlers.BaseEventHandler):
             raise SystemExit()
         elif event.sym == tcod.event.KeySym.c:
             try:
-                return input_handlers.MainGameEventHandler(load_game("savegame.sav"))
+                return input_handlers.MainGameEventHandler(load_game(config.SAVE_FILE))
             except FileNotFoundError:
                 return input_handlers.PopupMessage(self, "No saved game to load.")
+            except exceptions.IncompatibleSave as exc:
+                return input_handlers.PopupMessage(self, f"Incompatible save:\n{exc}")
             except Exception as exc:
                 traceback.print_exc()  # Print to stderr.
                 return input_handlers.PopupMessage(self, f"Failed to load save:\n{exc}")
         elif event.sym == tcod.event.KeySym.n:
-            return input_handlers.MainGameEventHandler(new_game())
+            return NewGameLoader(self)
+
+        return None
+
+
+class NewGameLoader(input_handlers.BaseEventHandler):
+    """
+    Build a new game in a worker thread and show its progress meanwhile.
+    [ESC] cancels generation and goes back to `parent`.
+    """
+
+    wait_timeout = 1 / 30  # Keep redrawing the progress bar while no input arrives.
+
+    def __init__(self, parent: input_handlers.BaseEventHandler):
+        self.parent = parent
+        self.status = (0.0, "Starting...")
+        self.engine: Optional[Engine] = None
+        self.error: Optional[Exception] = None
+        self.cancelled = threading.Event()
+        self.last_report = 0.0
+        self.thread = threading.Thread(target=self.run, name="new_game", daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        """Runs in the worker thread."""
+        try:
+            self.engine = new_game(progress=self.report)
+        except exceptions.GenerationCancelled:
+            pass
+        except Exception as exc:
+            traceback.print_exc()  # Print to stderr.
+            self.error = exc
+
+    def report(self, fraction: float, text: str) -> None:
+        """Progress callback, runs in the worker thread."""
+        if self.cancelled.is_set():
+            raise exceptions.GenerationCancelled()
+        now = time.perf_counter()
+        if now - self.last_report >= PROGRESS_INTERVAL or fraction >= 1.0:
+            self.last_report = now
+            self.status = (fraction, text)  # Replaced as a whole, so the main thread never sees half of it.
+
+    def poll(self) -> input_handlers.BaseEventHandler:
+        if self.thread.is_alive():
+            return self
+        if self.cancelled.is_set():
+            return self.parent
+        if self.error is not None:
+            return input_handlers.PopupMessage(self.parent, f"Failed to create a new game:\n{self.error}")
+        return input_handlers.MainGameEventHandler(self.engine)
 
-        return None
\ No newline at end of file
+    def on_render(self, console: tcod.console.Console) -> None:
+        fraction, text = self.status
+        if self.cancelled.is_set():
+            text = "Cancelling..."
+        bar_width = console.width // 2
+        x = (console.width - bar_width) // 2
+        y = console.height // 2
+
+        console.print(console.width // 2, y - 4, "DIESEL", fg=color.menu_title, alignment=libtcodpy.CENTER)
+        console.print(console.width // 2, y - 2, text, fg=color.menu_text, alignment=libtcodpy.CENTER)
+        console.draw_rect(x=x, y=y, width=bar_width, height=1, ch=0, bg=color.bar_empty)
+        filled = int(fraction * bar_width)
+        if filled > 0:
+            console.draw_rect(x=x, y=y, width=filled, height=1, ch=0, bg=color.bar_filled)
+        console.print(console.width // 2, y, f"{fraction:.0%}", fg=color.bar_text, alignment=libtcodpy.CENTER)
+        console.print(console.width // 2, y + 2, "[ESC] Cancel", fg=color.menu_text, alignment=libtcodpy.CENTER)
+
+    def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[input_handlers.BaseEventHandler]:
+        if event.sym == tcod.event.KeySym.ESCAPE:
+            self.cancelled.set()
+        return None
+
+    def ev_quit(self, event: tcod.event.Quit) -> Optional[input_handlers.BaseEventHandler]:
+        self.cancelled.set()
+        raise SystemExit()
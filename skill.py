@@ -6,9 +6,14 @@ from engine import Engine
 from entity import Actor
 
 import categories.color as color
+from slotted import Slotted
 
 
-class Skill:
+class Skill(Slotted):
+    __slots__ = (
+        "name", "current_level", "current_xp", "level_up_base", "level_up_factor", "xp_given", "parent", "engine"
+    )
+
     def __init__(
         self,
         name: str = "noname",
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import Callable, ClassVar, Dict, List
+
+
+class Slotted:
+    """
+    Base for classes that keep their attributes in `__slots__` instead of a `__dict__`.
+
+    Slotted objects pickle their state as `(None, {slot: value})`, while saves made before
+    the classes had slots hold a plain `__dict__`. `__setstate__` accepts both, and also
+    works for subclasses that don't declare slots and so still have a `__dict__`.
+
+    Saves also outlive changes to the attributes. `__setstate__` maps the old names in
+    `_renamed` to the new ones and then calls `_upgrade`, where subclasses fill in the
+    attributes added since. Upgrades that need other objects of the save to be complete
+    go through `defer_upgrade` and run in `finish_upgrades`, once everything is loaded.
+    """
+
+    __slots__ = ()
+
+    # Attributes renamed since older saves were made, old name -> new name.
+    _renamed: ClassVar[Dict[str, str]] = {}
+
+    def __setstate__(self, state) -> None:
+        if isinstance(state, tuple):
+            dict_state, slot_state = state
+            state = {**(dict_state or {}), **(slot_state or {})}
+        for name, value in state.items():
+            setattr(self, self._renamed.get(name, name), value)
+        self._upgrade()
+
+    def _upgrade(self) -> None:
+        """Fill in the attributes missing from states saved before they were added."""
+
+
+# Upgrades waiting for the rest of the object graph being loaded, see `defer_upgrade`.
+_deferred: List[Callable[[], None]] = []
+
+
+def defer_upgrade(upgrade: Callable[[], None]) -> None:
+    """
+    Run `upgrade` in the next `finish_upgrades`.
+
+    While unpickling, the objects an object refers to may not have their own state yet
+    (because of reference cycles), so work that reads them has to wait until loading is done.
+    """
+    _deferred.append(upgrade)
+
+
+def finish_upgrades() -> None:
+    """Run the upgrades deferred while loading, in the order they were deferred."""
+    while _deferred:
+        _deferred.pop(0)()
+
+
+def discard_upgrades() -> None:
+    """Forget the deferred upgrades, after a load failed."""
+    _deferred.clear()
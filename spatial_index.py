@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from entity import Entity
+
+
+class SpatialIndex:
+    """
+    Position index for the entities of a GameMap, so "what is at (x, y)" doesn't scan every entity.
+
+    Each entity is filed under the position it had when it was last added or updated,
+    which is why `update` must be called after an entity's x/y change.
+    """
+
+    def __init__(self, entities: Iterable[Entity] = ()):
+        self.cells: Dict[Tuple[int, int], List[Entity]] = {}
+        self.positions: Dict[Entity, Tuple[int, int]] = {}
+        for entity in entities:
+            self.add(entity)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, entity: Entity) -> bool:
+        return entity in self.positions
+
+    def add(self, entity: Entity) -> None:
+        if entity in self.positions:
+            self.update(entity)
+            return
+        position = entity.x, entity.y
+        self.positions[entity] = position
+        self.cells.setdefault(position, []).append(entity)
+
+    def remove(self, entity: Entity) -> None:
+        position = self.positions.pop(entity)
+        cell = self.cells[position]
+        cell.remove(entity)
+        if not cell:
+            del self.cells[position]
+
+    def discard(self, entity: Entity) -> None:
+        if entity in self.positions:
+            self.remove(entity)
+
+    def update(self, entity: Entity) -> None:
+        """File the entity under its current position."""
+        if self.positions.get(entity) != (entity.x, entity.y):
+            self.remove(entity)
+            self.add(entity)
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.positions.clear()
+
+    def at(self, x: int, y: int) -> List[Entity]:
+        """Return the entities at (x, y). The list belongs to the index, don't modify it."""
+        return self.cells.get((x, y), [])
+
+    def in_rect(self, x0: int, y0: int, x1: int, y1: int) -> Iterator[Entity]:
+        """Iterate over the entities inside [x0:x1, y0:y1]."""
+        if (x1 - x0) * (y1 - y0) <= len(self.cells):
+            # Small area: probe its cells.
+            for x in range(x0, x1):
+                for y in range(y0, y1):
+                    yield from self.cells.get((x, y), ())
+        else:
+            for (x, y), cell in self.cells.items():
+                if x0 <= x < x1 and y0 <= y < y1:
+                    yield from cell
+
+    def check(self, entities: Iterable[Entity]) -> None:
+        """Raise AssertionError if the index doesn't match `entities` and their positions."""
+        entities = set(entities)
+        assert set(self.positions) == entities, (
+            f"Index has {len(self.positions)} entities, map has {len(entities)}."
+        )
+        for entity in entities:
+            position = entity.x, entity.y
+            assert self.positions[entity] == position, (
+                f"{entity.name} is indexed at {self.positions[entity]} but is at {position}."
+            )
+            assert entity in self.cells.get(position, ()), f"{entity.name} is missing from cell {position}."
+        assert sum(len(cell) for cell in self.cells.values()) == len(entities), "Index has stale entries."
@@ -0,0 +1,55 @@
+"""On-disk cache of generated world blocks, stored as one .npy file per block."""
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+from typing import Optional
+
+import numpy as np  # type: ignore
+
+
+class LayerCache:
+    """
+    A directory of arrays named after the block they cover, such as `tiles/64_128_64x64.npy`.
+
+    Writes go to a temporary file that is then renamed, so a game closed mid-write or two
+    threads generating the same block never leave a truncated file behind.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def touch(self) -> None:
+        """Mark this cache as just used, so `prune` deletes older ones first."""
+        os.makedirs(self.directory, exist_ok=True)
+        os.utime(self.directory)
+
+    def path(self, layer: str, x: int, y: int, width: int, height: int) -> str:
+        return os.path.join(self.directory, layer, f"{x}_{y}_{width}x{height}.npy")
+
+    def load(self, layer: str, x: int, y: int, width: int, height: int) -> Optional[np.ndarray]:
+        """Return the cached block, or None if it isn't cached (or the file is unreadable)."""
+        try:
+            return np.load(self.path(layer, x, y, width, height), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, layer: str, x: int, y: int, width: int, height: int, array: np.ndarray) -> None:
+        path = self.path(layer, x, y, width, height)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            np.save(f, array, allow_pickle=False)
+        os.replace(temporary, path)
+
+
+def prune(root: str, keep: int) -> None:
+    """Delete all but the `keep` most recently used caches in `root`."""
+    try:
+        caches = [entry for entry in os.scandir(root) if entry.is_dir()]
+    except FileNotFoundError:
+        return
+    caches.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in caches[keep:]:
+        shutil.rmtree(entry.path, ignore_errors=True)